@@ -0,0 +1,211 @@
+"""
+Batch badge rendering for roster imports.
+
+    python -m app.batch roster.csv --photos photos/ [--out DIR] [--workers N]
+
+The roster is CSV (header row) or JSONL with the kiosk form fields
+(name, employee_number, title, phone, email) and an optional `photo`
+column; without it the photo is looked up as <employee_number>.jpg/.jpeg/.png
+in the photo directory.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.render_pool import RenderQueueFull, warm_render_worker
+from app.utils import PNG_DEFAULT, BadgeEncoding, generate_badge_png
+
+FORM_FIELDS = ("name", "employee_number", "title", "phone", "email")
+PHOTO_EXTS = (".jpg", ".jpeg", ".png")
+DEFAULT_OUTDIR = "app/badge_outputs/batch"
+
+# progress(done, total, row, error) after each row
+Progress = Callable[[int, int, Dict[str, str], Optional[str]], None]
+AsyncProgress = Callable[[int, int, Dict[str, str], Optional[str]], Awaitable[None]]
+
+
+@dataclass
+class BatchResult:
+    # (employee_number, badge path) / (employee_number, error message)
+    rendered: List[Tuple[str, str]] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def parse_roster(text: str, fmt: Optional[str] = None) -> List[Dict[str, str]]:
+    """Parses CSV or JSONL roster text; fmt is sniffed from the content if None."""
+    if fmt is None:
+        fmt = "jsonl" if text.lstrip().startswith("{") else "csv"
+    if fmt == "jsonl":
+        rows = []
+        for n, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError(f"line {n}: expected an object")
+            rows.append(row)
+    elif fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        raise ValueError(f"Unknown roster format: {fmt!r}")
+    return [
+        {k.strip(): str(v or "").strip() for k, v in row.items() if k} for row in rows
+    ]
+
+
+def load_roster(path: Path, fmt: Optional[str] = None) -> List[Dict[str, str]]:
+    if fmt is None and path.suffix.lower() in (".jsonl", ".ndjson"):
+        fmt = "jsonl"
+    return parse_roster(path.read_text(encoding="utf-8-sig"), fmt)
+
+
+def find_photo(row: Dict[str, str], photo_dir: Path) -> Path:
+    """Roster photos must resolve inside photo_dir (no "../", absolute paths)."""
+    root = photo_dir.resolve()
+    if row.get("photo"):
+        candidates = [photo_dir / row["photo"]]
+    else:
+        number = row.get("employee_number", "")
+        candidates = [photo_dir / f"{number}{ext}" for ext in PHOTO_EXTS]
+    for path in candidates:
+        if path.resolve().is_relative_to(root) and path.is_file():
+            return path
+    label = row.get("employee_number") or row.get("name")
+    raise FileNotFoundError(f"No photo for {label!r}")
+
+
+def render_row(
+    row: Dict[str, str],
+    photo_dir: str,
+    outdir: str,
+    encoding: BadgeEncoding = PNG_DEFAULT,
+) -> str:
+    """Renders one roster row; top-level so worker processes can unpickle it."""
+    formdata = {key: row.get(key, "") for key in FORM_FIELDS}
+    photo = find_photo(row, Path(photo_dir))
+    return generate_badge_png(formdata, photo, outdir=outdir, encoding=encoding)
+
+
+def render_batch(
+    rows: Iterable[Dict[str, str]],
+    photo_dir: Path,
+    outdir: str = DEFAULT_OUTDIR,
+    workers: Optional[int] = None,
+    progress: Optional[Progress] = None,
+    encoding: BadgeEncoding = PNG_DEFAULT,
+) -> BatchResult:
+    """Renders all rows on a dedicated process pool (CLI / offline use)."""
+    rows = list(rows)
+    result = BatchResult()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=warm_render_worker
+    ) as pool:
+        futures = {
+            pool.submit(render_row, row, str(photo_dir), outdir, encoding): row
+            for row in rows
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            row = futures[future]
+            error = _collect(result, row, future.exception() or future.result())
+            if progress:
+                progress(done, len(rows), row, error)
+    return result
+
+
+async def render_batch_async(
+    rows: List[Dict[str, str]],
+    photo_dir: Path,
+    run: Callable[..., Awaitable[str]],
+    outdir: str = DEFAULT_OUTDIR,
+    concurrency: int = 1,
+    progress: Optional[AsyncProgress] = None,
+    encoding: BadgeEncoding = PNG_DEFAULT,
+) -> BatchResult:
+    """
+    Renders rows through a shared pool's async `run` (e.g. RenderPool.run),
+    keeping at most `concurrency` renders in flight so kiosks are not starved.
+    """
+    result = BatchResult()
+    sem = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def one(row: Dict[str, str]) -> None:
+        nonlocal done
+        async with sem:
+            while True:
+                try:
+                    outcome = await run(
+                        render_row, row, str(photo_dir), outdir, encoding
+                    )
+                    break
+                except RenderQueueFull:
+                    await asyncio.sleep(0.5)  # walk-up traffic has the pool
+                except Exception as e:
+                    outcome = e
+                    break
+        error = _collect(result, row, outcome)
+        done += 1
+        if progress:
+            await progress(done, len(rows), row, error)
+
+    await asyncio.gather(*(one(row) for row in rows))
+    return result
+
+
+def _collect(result: BatchResult, row: Dict[str, str], outcome) -> Optional[str]:
+    emp = row.get("employee_number", "")
+    if isinstance(outcome, BaseException):
+        result.failed.append((emp, str(outcome)))
+        return str(outcome)
+    result.rendered.append((emp, outcome))
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.batch", description="Render badges for a whole roster."
+    )
+    parser.add_argument("roster", type=Path, help="CSV or JSONL roster file")
+    parser.add_argument("--photos", type=Path, required=True, help="photo directory")
+    parser.add_argument("--out", default=DEFAULT_OUTDIR, help="output directory")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="render processes"
+    )
+    parser.add_argument(
+        "--format", choices=("csv", "jsonl"), help="roster format (default: sniff)"
+    )
+    parser.add_argument(
+        "--encoding",
+        type=BadgeEncoding.parse,
+        default=PNG_DEFAULT,
+        help="badge encoding: png[:0-9][:optimize], bmp or ppm (default: png:6)",
+    )
+    args = parser.parse_args(argv)
+
+    rows = load_roster(args.roster, args.format)
+
+    def report(done: int, total: int, row: Dict[str, str], error: Optional[str]) -> None:
+        label = row.get("employee_number") or row.get("name", "?")
+        status = f"FAILED: {error}" if error else "ok"
+        print(f"[{done}/{total}] {label} {status}", file=sys.stderr)
+
+    result = render_batch(
+        rows, args.photos, args.out, args.workers, report, args.encoding
+    )
+    print(
+        f"{len(result.rendered)} rendered, {len(result.failed)} failed -> {args.out}",
+        file=sys.stderr,
+    )
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+
+from app.jobs import Job
+
+
+class JobEvents:
+    """
+    In-process fan-out of job updates to push subscribers (SSE streams).
+    Must be used from the event loop thread. Updates made by other worker
+    processes are not seen here; subscribers resync from the job store.
+    """
+
+    def __init__(self, max_backlog: int = 32):
+        self.max_backlog = max_backlog
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def publish(self, job_id: str, job: Optional[Job]) -> None:
+        if job is None:
+            return
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                # slow consumer: only the latest state matters
+                queue.get_nowait()
+            queue.put_nowait(job)
+
+    @contextmanager
+    def subscribe(self, job_id: str) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(self.max_backlog)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subs = self._subscribers.get(job_id)
+            if subs is not None:
+                subs.discard(queue)
+                if not subs:
+                    del self._subscribers[job_id]
+
+    def __len__(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
@@ -0,0 +1,274 @@
+import json
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.storage import SQLiteConnections
+
+# A task is the queue's view of a job:
+# {"job_id": str, "kind": str, "payload": dict, "steps": [str], "attempts": int}
+Task = Dict
+
+
+class LeaseLost(Exception):
+    """The task's lease expired and may now be held by another worker."""
+
+
+def worker_id() -> str:
+    """Lease owner name, unique per process (host:pid:random)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True  # os.kill(pid, 0) would terminate it on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by someone else
+    return True
+
+
+class DurableQueue:
+    """
+    SQLite (WAL mode) job queue with at-least-once execution. A worker
+    claims a task under a lease and keeps it alive with heartbeat(); a task
+    whose lease ran out (worker crashed or restarted) is handed out again.
+    Steps recorded with mark_step() are persisted with the task so a
+    resumed run can skip work that already happened (e.g. printing).
+
+    state: pending -> leased -> done | failed
+    """
+
+    def __init__(self, path: Path, retention: float = 86400):
+        self._db = SQLiteConnections(path)
+        self._conn = self._db.get
+        self.path = self._db.path
+        self.retention = retention  # finished tasks are purged after this
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " job_id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " state TEXT NOT NULL,"
+                " steps TEXT NOT NULL DEFAULT '[]',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " lease_owner TEXT,"
+                " lease_until REAL,"
+                " error TEXT,"
+                " dedup_key TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+            if "dedup_key" not in columns:  # journal created before dedup keys
+                conn.execute("ALTER TABLE tasks ADD COLUMN dedup_key TEXT")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS tasks_dedup ON tasks (dedup_key, created_at)"
+            )
+
+    def enqueue(
+        self,
+        job_id: str,
+        kind: str,
+        payload: Dict,
+        owner: Optional[str] = None,
+        lease: float = 0,
+        dedup_key: Optional[str] = None,
+        window: float = 0,
+    ) -> str:
+        """
+        Adds a pending task, or with `owner` one already leased to the
+        caller (who runs it right away and must heartbeat it). If a task
+        with the same dedup_key was added in the last `window` seconds and
+        has not failed, nothing is added and that task's job_id is returned
+        instead of job_id.
+        """
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if dedup_key is not None:
+                row = conn.execute(
+                    "SELECT job_id FROM tasks WHERE dedup_key = ? AND created_at >= ?"
+                    " AND state != 'failed' ORDER BY created_at DESC LIMIT 1",
+                    (dedup_key, now - window),
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+            conn.execute(
+                "INSERT OR IGNORE INTO tasks (job_id, kind, payload, state, attempts,"
+                " lease_owner, lease_until, dedup_key, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    json.dumps(payload),
+                    "leased" if owner else "pending",
+                    1 if owner else 0,
+                    owner,
+                    now + lease if owner else None,
+                    dedup_key,
+                    now,
+                    now,
+                ),
+            )
+        return job_id
+
+    def claim(
+        self,
+        owner: str,
+        lease: float,
+        kind: Optional[str] = None,
+    ) -> Optional[Task]:
+        """
+        Leases the oldest pending (or lease-expired) task, of `kind` if given.
+        Returns None if there is nothing to claim.
+        "attempts" counts claims, this one included; callers give up on
+        tasks that keep getting interrupted.
+        """
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            query = (
+                "SELECT job_id, kind, payload, steps, attempts FROM tasks"
+                " WHERE (state = 'pending' OR (state = 'leased' AND lease_until < ?))"
+            )
+            params: list = [now]
+            if kind is not None:
+                query += " AND kind = ?"
+                params.append(kind)
+            query += " ORDER BY created_at LIMIT 1"
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            task_id, task_kind, payload, steps, attempts = row
+            conn.execute(
+                "UPDATE tasks SET state = 'leased', lease_owner = ?, lease_until = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                (owner, now + lease, now, task_id),
+            )
+        return {
+            "job_id": task_id,
+            "kind": task_kind,
+            "payload": json.loads(payload),
+            "steps": json.loads(steps),
+            "attempts": attempts + 1,
+        }
+
+    def _update_owned(self, job_id: str, owner: str, sql: str, params: tuple) -> bool:
+        with self._conn() as conn:
+            cur = conn.execute(
+                f"UPDATE tasks SET {sql}, updated_at = ?"
+                " WHERE job_id = ? AND lease_owner = ? AND state = 'leased'",
+                (*params, time.time(), job_id, owner),
+            )
+        return cur.rowcount == 1
+
+    def heartbeat(self, job_id: str, owner: str, lease: float) -> bool:
+        """Extends the lease; False if the task is no longer ours."""
+        return self._update_owned(
+            job_id, owner, "lease_until = ?", (time.time() + lease,)
+        )
+
+    def mark_step(self, job_id: str, owner: str, step: str) -> bool:
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT steps FROM tasks"
+                " WHERE job_id = ? AND lease_owner = ? AND state = 'leased'",
+                (job_id, owner),
+            ).fetchone()
+            if row is None:
+                return False
+            steps = json.loads(row[0])
+            if step not in steps:
+                steps.append(step)
+            conn.execute(
+                "UPDATE tasks SET steps = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(steps), time.time(), job_id),
+            )
+        return True
+
+    def complete(self, job_id: str, owner: str) -> bool:
+        return self._update_owned(
+            job_id, owner, "state = 'done', lease_owner = NULL", ()
+        )
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        return self._update_owned(
+            job_id, owner, "state = 'failed', lease_owner = NULL, error = ?", (error,)
+        )
+
+    def cancel(self, job_id: str, error: str) -> bool:
+        """
+        Fails an unfinished task (e.g. its caller gave up waiting): no worker
+        claims it later, and a worker already running it can no longer
+        complete() it. False if it had already finished.
+        """
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET state = 'failed', lease_owner = NULL, error = ?,"
+                " updated_at = ? WHERE job_id = ? AND state IN ('pending', 'leased')",
+                (error, time.time(), job_id),
+            )
+        return cur.rowcount == 1
+
+    def release_orphans(self, owner: str) -> int:
+        """
+        Expires leases held by dead processes on this host (e.g. the worker
+        uvicorn just replaced), other than `owner`, so their tasks resume now
+        rather than when the lease runs out. Returns how many were released.
+        """
+        prefix = f"{socket.gethostname()}:"
+        rows = self._conn().execute(
+            "SELECT job_id, lease_owner FROM tasks"
+            " WHERE state = 'leased' AND lease_owner LIKE ?",
+            (prefix + "%",),
+        ).fetchall()
+        released = 0
+        for job_id, holder in rows:
+            pid = int(holder.split(":")[1])
+            if holder == owner or (pid != os.getpid() and _pid_alive(pid)):
+                continue
+            with self._conn() as conn:
+                cur = conn.execute(
+                    "UPDATE tasks SET lease_until = 0"
+                    " WHERE job_id = ? AND lease_owner = ? AND state = 'leased'",
+                    (job_id, holder),
+                )
+            released += cur.rowcount
+        return released
+
+    def state(self, job_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """(state, error) of a task, or None if unknown (or pruned)."""
+        row = self._conn().execute(
+            "SELECT state, error FROM tasks WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute(
+            "SELECT state, COUNT(*) FROM tasks GROUP BY state"
+        ).fetchall()
+        return dict(rows)
+
+    def prune(self) -> int:
+        """Deletes finished tasks older than retention; returns how many."""
+        with self._conn() as conn:
+            cur = conn.execute(
+                "DELETE FROM tasks"
+                " WHERE state IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.retention,),
+            )
+        return cur.rowcount
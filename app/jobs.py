@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.storage import ExpiringLRU, SQLiteConnections
+
+# A job is a small JSON-able dict:
+# {"status": str, "step": str, "badge_path": str|None, "error": str|None,
+#  "version": int}  # version: bumped by the store on every write
+Job = Dict
+
+
+def _next_version(job: Job, fields: Dict) -> Job:
+    return {**job, **fields, "version": job.get("version", 0) + 1}
+
+
+class JobStore(ABC):
+    """
+    Interface for print job state shared by /print, /status and /confirm.
+    Backends return copies; mutate through update() only.
+    """
+
+    @abstractmethod
+    def create(self, job_id: str, job: Job) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> Optional[Job]:
+        """
+        Merge fields into the job and bump its version; returns the new job
+        or None if unknown.
+        """
+        ...
+
+    @abstractmethod
+    def live_jobs(self) -> List[Job]:
+        """Snapshot of all jobs that have not expired."""
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class MemoryJobStore(JobStore):
+    """
+    Process-local LRU with TTL. Fast, but not shared between workers and
+    lost on restart.
+    """
+
+    def __init__(self, max_jobs: int = 1000, ttl: float = 3600):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs: ExpiringLRU[Job] = ExpiringLRU(max_jobs, ttl)
+
+    def create(self, job_id: str, job: Job) -> None:
+        with self._lock:
+            self._jobs.put(job_id, _next_version(job, {}))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id: str, **fields) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = _next_version(job, fields)
+            self._jobs.put(job_id, job)
+            return dict(job)
+
+    def live_jobs(self) -> List[Job]:
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLite (WAL mode) backed store, shared by every worker process pointing
+    at the same file and surviving restarts. Jobs idle longer than ttl are
+    purged on write.
+    """
+
+    def __init__(self, path: Path, ttl: float = 3600):
+        self._db = SQLiteConnections(path)
+        self._conn = self._db.get
+        self.path = self._db.path
+        self.ttl = ttl
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)"
+            )
+
+    def create(self, job_id: str, job: Job) -> None:
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl,))
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, updated_at) VALUES (?, ?, ?)",
+                (job_id, json.dumps(_next_version(job, {})), now),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._conn().execute(
+            "SELECT data FROM jobs WHERE job_id = ? AND updated_at >= ?",
+            (job_id, time.time() - self.ttl),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id: str, **fields) -> Optional[Job]:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = _next_version(json.loads(row[0]), fields)
+            conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(job), time.time(), job_id),
+            )
+            return job
+
+    def live_jobs(self) -> List[Job]:
+        rows = self._conn().execute(
+            "SELECT data FROM jobs WHERE updated_at >= ?", (time.time() - self.ttl,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def __len__(self) -> int:
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE updated_at >= ?",
+            (time.time() - self.ttl,),
+        ).fetchone()
+        return row[0]
+
+
+def make_job_store(
+    backend: str, db_path: Path, ttl: float, max_jobs: int
+) -> JobStore:
+    if backend == "memory":
+        return MemoryJobStore(max_jobs=max_jobs, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteJobStore(db_path, ttl=ttl)
+    raise ValueError(f"Unknown job store backend: {backend!r}")
@@ -1,18 +1,45 @@
 # app/main.py
 import os
 import uuid
+import time
+import shutil
 import asyncio
 import base64
+import hashlib
+import json
+import logging
+import secrets
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict
+from typing import Optional, Tuple
 
-from fastapi import FastAPI, Request, Form, Response, status, BackgroundTasks
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import (
+    FastAPI, Request, Form, File, UploadFile, Response, status, BackgroundTasks,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import (
+    HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 from itsdangerous import URLSafeSerializer, BadSignature
 
-from app.utils import generate_badge_png
+from app.batch import parse_roster, render_batch_async
+from app.events import JobEvents
+from app.job_queue import DurableQueue, LeaseLost, worker_id
+from app.jobs import make_job_store
+from app.metrics import CONTENT_TYPE, Gauge, Histogram, Registry
+from app.printers import make_printer_pool
+from app.render_cache import RenderCache
+from app.render_pool import RenderPool, RenderQueueFull
+from app.scheduler import PRIORITIES, JobScheduler
+from app.sessions import make_session_store
+from app.sweeper import SweepTarget, Sweeper
+from app.utils import (
+    THUMB_EXT, BadgeEncoding, atomic_write_bytes, normalize_photo, render_badge,
+)
+
+log = logging.getLogger(__name__)
 
 # -----------------------------------------------------------------------------
 # Config
@@ -20,6 +47,11 @@ from app.utils import generate_badge_png
 SECRET_KEY = os.getenv("BADGEMATIC_SECRET_KEY", "dev_secret_badgematic")
 SESSION_COOKIE = "badgematic_session"
 SESSION_MAX_AGE = 60 * 60  # 1 hour
+# Session data: "cookie" (all of it, signed, in the cookie), or server-side in
+# "memory" (single worker) / "sqlite" (shared by --workers N) with only a
+# signed session id in the cookie
+SESSION_BACKEND = os.getenv("BADGEMATIC_SESSION_BACKEND", "cookie")
+SESSION_MAX = int(os.getenv("BADGEMATIC_SESSION_MAX", 1000))  # memory backend only
 
 # Paths (robust relative to this file)
 BASE_DIR = Path(__file__).resolve().parent
@@ -27,11 +59,148 @@ STATIC_DIR = BASE_DIR / "static"
 TEMPLATES_DIR = BASE_DIR / "templates"
 UPLOAD_DIR = STATIC_DIR / "uploads"   # where we save captured photos
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes copied per read when saving uploads
+OUTPUT_DIR = BASE_DIR / "badge_outputs"
+SESSION_DB_PATH = Path(
+    os.getenv("BADGEMATIC_SESSION_DB", BASE_DIR / "data" / "sessions.sqlite3")
+)
+
+# POST /batch: photo dirs must live under this root; renders in flight per batch
+BATCH_PHOTO_ROOT = Path(
+    os.getenv("BADGEMATIC_BATCH_PHOTO_ROOT", BASE_DIR / "batch_photos")
+)
+BATCH_CONCURRENCY = int(os.getenv("BADGEMATIC_BATCH_CONCURRENCY", 0))  # 0 -> half pool
+BATCH_MAX_ERRORS = 50  # error messages kept on the batch job record
+
+# Job store: "memory" (single worker) or "sqlite" (shared by --workers N)
+JOB_STORE_BACKEND = os.getenv("BADGEMATIC_JOB_STORE", "memory")
+JOB_DB_PATH = Path(os.getenv("BADGEMATIC_JOB_DB", BASE_DIR / "data" / "jobs.sqlite3"))
+JOB_TTL = int(os.getenv("BADGEMATIC_JOB_TTL", SESSION_MAX_AGE))
+JOB_MAX = int(os.getenv("BADGEMATIC_JOB_MAX", 1000))  # memory backend only
+
+# Durable print queue (SQLite): a job whose worker stops heartbeating for
+# JOB_LEASE seconds (crash, restart) is resumed by any worker; printing is
+# recorded as a step so a resumed job never prints twice.
+QUEUE_DB_PATH = Path(
+    os.getenv("BADGEMATIC_QUEUE_DB", BASE_DIR / "data" / "queue.sqlite3")
+)
+JOB_LEASE = float(os.getenv("BADGEMATIC_JOB_LEASE", 30))
+JOB_MAX_ATTEMPTS = int(os.getenv("BADGEMATIC_JOB_MAX_ATTEMPTS", 3))
+# Repeated /print submissions of the same session inputs within this many
+# seconds (double-click, resubmit) return the existing job. Submissions that
+# carry an idempotency key are deduplicated for as long as the job lives.
+PRINT_DEDUP_WINDOW = float(os.getenv("BADGEMATIC_PRINT_DEDUP_WINDOW", 10))
+
+# Badge rendering pool: "process" or "thread", worker count, extra queue slots
+RENDER_EXECUTOR = os.getenv("BADGEMATIC_RENDER_EXECUTOR", "process")
+RENDER_WORKERS = int(os.getenv("BADGEMATIC_RENDER_WORKERS", 0)) or None  # 0 -> cpu count
+RENDER_QUEUE = int(os.getenv("BADGEMATIC_RENDER_QUEUE", 16))
+# "pool": render in this process's RenderPool. "worker": enqueue render tasks
+# in the job queue for `python -m app.worker` processes (shared JOB_STORE
+# "sqlite" lets them report progress); give up after RENDER_TIMEOUT seconds.
+RENDER_BACKEND = os.getenv("BADGEMATIC_RENDER_BACKEND", "pool")
+RENDER_TIMEOUT = float(os.getenv("BADGEMATIC_RENDER_TIMEOUT", 60))
+RENDER_SPOOL_DIR = OUTPUT_DIR / "rendered"  # worker output, read back then deleted
+
+# Scheduler in front of render + print: jobs (and batch rows) holding a slot
+# at once, served by priority then round-robin per kiosk. 0 -> 2x render workers
+MAX_IN_FLIGHT = int(os.getenv("BADGEMATIC_MAX_IN_FLIGHT", 0))
+# Front-desk token: only requests sending it as X-Vip-Token may print at vip
+# priority or read /admin/*. Unset -> both disabled; kiosks choose walkup or
+# reprint.
+VIP_TOKEN = os.getenv("BADGEMATIC_VIP_TOKEN", "")
+
+# Default badge output encoding: "png[:compress_level][:optimize]", "bmp" or "ppm".
+# Fast PNG by default: the file is a one-shot print artifact. Jobs may override.
+BADGE_ENCODING = BadgeEncoding.parse(os.getenv("BADGEMATIC_BADGE_ENCODING", "png:1"))
+
+# Content-addressed cache of rendered badges for reprints (0 MB disables it)
+RENDER_CACHE_DIR = Path(
+    os.getenv("BADGEMATIC_RENDER_CACHE_DIR", OUTPUT_DIR / "cache")
+)
+RENDER_CACHE_MB = int(os.getenv("BADGEMATIC_RENDER_CACHE_MB", 256))
+
+# Where finished badges go: simulated://[?delay=s], file:///spool/dir,
+# pipe:<command line> (badge on stdin), lp://[destination][?opt=val] (CUPS) or
+# tcp://host[:9100] (raw/JetDirect, kept-alive; `python -m app.spooler` fakes one)
+PRINTER_URL = os.getenv("BADGEMATIC_PRINTER", "simulated://")
+# Several printers: "name=url,name=url"; jobs go to the assigned (POST /print
+# `printer`) or least-loaded one, failing over when one errors. A failed
+# printer is skipped for PRINTER_COOLDOWN seconds.
+PRINTERS_SPEC = os.getenv("BADGEMATIC_PRINTERS", PRINTER_URL)
+PRINTER_COOLDOWN = float(os.getenv("BADGEMATIC_PRINTER_COOLDOWN", 30))
+# Badges are rendered in memory and streamed to the printer; set to 1 to also
+# keep a copy under OUTPUT_DIR (debugging, audit)
+ARCHIVE_BADGES = os.getenv("BADGEMATIC_ARCHIVE_BADGES", "0") == "1"
+
+# Background sweeper for abandoned uploads and outputs (TTL in s, quotas in MB)
+SWEEP_INTERVAL = float(os.getenv("BADGEMATIC_SWEEP_INTERVAL", 300))
+UPLOAD_TTL = float(os.getenv("BADGEMATIC_UPLOAD_TTL", 2 * SESSION_MAX_AGE))
+UPLOAD_QUOTA_MB = int(os.getenv("BADGEMATIC_UPLOAD_QUOTA_MB", 1024))
+OUTPUT_TTL = float(os.getenv("BADGEMATIC_OUTPUT_TTL", 24 * 60 * 60))
+OUTPUT_QUOTA_MB = int(os.getenv("BADGEMATIC_OUTPUT_QUOTA_MB", 2048))
+
+# /status/stream re-reads the job store this often, in case another worker
+# process owns the job (its updates are not published in this process)
+STATUS_STREAM_RESYNC = float(os.getenv("BADGEMATIC_STATUS_STREAM_RESYNC", 2.0))
 
 # -----------------------------------------------------------------------------
 # App & templating
 # -----------------------------------------------------------------------------
-app = FastAPI()
+# CPU-bound badge composition runs here, never on the event loop
+RENDER_POOL = RenderPool(RENDER_EXECUTOR, RENDER_WORKERS, RENDER_QUEUE)
+RENDER_CACHE = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MB * 1024 * 1024)
+PRINTERS = make_printer_pool(PRINTERS_SPEC, PRINTER_COOLDOWN)
+SCHEDULER = JobScheduler(MAX_IN_FLIGHT or 2 * RENDER_POOL.workers)
+JOB_QUEUE = DurableQueue(QUEUE_DB_PATH, retention=JOB_TTL)
+WORKER_ID = worker_id()  # lease owner for the jobs this process runs
+
+
+def referenced_files() -> set:
+    """Files and directories still used by live jobs; the sweeper keeps them."""
+    refs = set()
+    for job in PRINT_JOBS.live_jobs():
+        if job.get("badge_path"):
+            refs.add(Path(job["badge_path"]).resolve())
+        if job.get("photo_path"):
+            refs.add((UPLOAD_DIR / Path(job["photo_path"]).name).resolve())
+    return refs
+
+
+SWEEPER = Sweeper(
+    [
+        # a session's photo and print crop are needed until the session expires
+        SweepTarget(
+            UPLOAD_DIR,
+            UPLOAD_TTL,
+            UPLOAD_QUOTA_MB * 1024 * 1024,
+            min_age=SESSION_MAX_AGE,
+        ),
+        # the render cache bounds itself (RenderCache.evict)
+        SweepTarget(
+            OUTPUT_DIR,
+            OUTPUT_TTL,
+            OUTPUT_QUOTA_MB * 1024 * 1024,
+            exclude=(RENDER_CACHE_DIR.name,),
+        ),
+    ],
+    referenced_files,
+    SWEEP_INTERVAL,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper_task = asyncio.create_task(SWEEPER.run_forever())
+    recovery_task = asyncio.create_task(recover_print_jobs_forever())
+    yield
+    sweeper_task.cancel()
+    recovery_task.cancel()  # running jobs keep their lease and get resumed
+    await PRINTERS.close()
+    RENDER_POOL.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount static for Tailwind/DaisyUI output, JS, images, etc.
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
@@ -39,12 +208,164 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 # Jinja2 templates (path-safe)
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
-# Print jobs in-memory registry
-PRINT_JOBS: Dict[str, Dict] = {}  # job_id -> {"step": str, "status": str, "badge_path": str|None, "error": str|None}
+
+# -----------------------------------------------------------------------------
+# Metrics (GET /metrics, Prometheus text format; per worker process)
+# -----------------------------------------------------------------------------
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+METRICS = Registry()
+PIPELINE_STEP_SECONDS = METRICS.register(
+    Histogram(
+        "badgematic_pipeline_step_seconds",
+        "Time spent in each print pipeline step.",
+        ["step"],
+    )
+)
+JOB_SECONDS = METRICS.register(
+    Histogram(
+        "badgematic_job_seconds",
+        "Time from /print to printed badge (or failure).",
+        ["outcome"],
+        buckets=(0.5, 1, 1.5, 2, 3, 5, 10, 20, 30, 60),
+    )
+)
+REQUEST_SECONDS = METRICS.register(
+    Histogram(
+        "badgematic_http_request_seconds",
+        "HTTP request latency per route.",
+        ["method", "route", "status"],
+    )
+)
+METRICS.register(
+    Gauge(
+        "badgematic_render_queue_depth",
+        "Renders pending on the render pool (running + queued).",
+        collect=lambda: {(): RENDER_POOL.pending},
+    )
+)
+JOBS_IN_FLIGHT = METRICS.register(
+    Gauge("badgematic_jobs_in_flight", "Jobs still processing.")
+)
+JOBS_HELD = METRICS.register(
+    Gauge("badgematic_print_jobs", "Jobs held by the job store (PRINT_JOBS).")
+)
+METRICS.register(
+    Gauge(
+        "badgematic_scheduler_queued",
+        "Jobs waiting for a scheduler slot, per priority.",
+        ["priority"],
+        collect=lambda: {
+            (p,): sum(t.priority == p for t in SCHEDULER.waiting()) for p in PRIORITIES
+        },
+    )
+)
+METRICS.register(
+    Gauge(
+        "badgematic_scheduler_in_flight",
+        "Jobs holding a scheduler slot (rendering or printing).",
+        collect=lambda: {(): SCHEDULER.in_flight},
+    )
+)
+METRICS.register(
+    Gauge(
+        "badgematic_printer_pending",
+        "Jobs queued on or printing at each printer.",
+        ["printer"],
+        collect=lambda: {(n,): s["pending"] for n, s in PRINTERS.stats().items()},
+    )
+)
+METRICS.register(
+    Gauge(
+        "badgematic_printer_online",
+        "1 if the printer is in rotation, 0 while it cools down after an error.",
+        ["printer"],
+        collect=lambda: {(n,): int(s["online"]) for n, s in PRINTERS.stats().items()},
+    )
+)
+METRICS.register(
+    Gauge(
+        "badgematic_render_cache_hits",
+        "Renders served from the on-disk render cache.",
+        collect=lambda: {(): RENDER_CACHE.stats()["hits"]},
+    )
+)
+METRICS.register(
+    Gauge(
+        "badgematic_render_cache_misses",
+        "Render cache lookups that had to render.",
+        collect=lambda: {(): RENDER_CACHE.stats()["misses"]},
+    )
+)
+METRICS.register(
+    Gauge(
+        "badgematic_render_resources_hits",
+        "Template/font loads served by the render workers' in-memory cache.",
+        collect=lambda: {(): RENDER_POOL.resource_stats()["hits"]},
+    )
+)
+METRICS.register(
+    Gauge(
+        "badgematic_render_resources_misses",
+        "Template/font loads the render workers had to read from disk.",
+        collect=lambda: {(): RENDER_POOL.resource_stats()["misses"]},
+    )
+)
+DISK_USAGE = METRICS.register(
+    Gauge(
+        "badgematic_disk_usage_bytes",
+        "Bytes used by uploads and badge outputs.",
+        ["dir"],
+    )
+)
+
+
+def measure_blocking_gauges() -> None:
+    """Job store and disk gauges (blocking I/O; run off the event loop)."""
+    jobs = PRINT_JOBS.live_jobs()
+    JOBS_IN_FLIGHT.set(sum(j.get("status") == "processing" for j in jobs))
+    JOBS_HELD.set(len(PRINT_JOBS))
+    DISK_USAGE.set(_dir_size(UPLOAD_DIR), dir="uploads")
+    DISK_USAGE.set(_dir_size(OUTPUT_DIR), dir="outputs")
+
+
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    return response
+
+# Print jobs registry (see app/jobs.py)
+PRINT_JOBS = make_job_store(JOB_STORE_BACKEND, JOB_DB_PATH, JOB_TTL, JOB_MAX)
+
+# Push channel for job step transitions (SSE)
+JOB_EVENTS = JobEvents()
 
 # Signed-cookie session serializer
 serializer = URLSafeSerializer(SECRET_KEY, salt="badgematic")
 
+# Server-side session data (see app/sessions.py); None -> cookie sessions
+SESSION_STORE = make_session_store(
+    SESSION_BACKEND, SESSION_DB_PATH, SESSION_MAX_AGE, SESSION_MAX
+)
+SESSION_ID_KEY = "_sid"  # where a server-side session keeps its own id
+
 
 # -----------------------------------------------------------------------------
 # Session helpers
@@ -54,25 +375,64 @@ def get_session_data(request: Request) -> dict:
     if not cookie:
         return {}
     try:
-        return serializer.loads(cookie)
+        data = serializer.loads(cookie)
     except BadSignature:
         # Bad/expired cookie -> treat as new session
         return {}
+    if SESSION_STORE is None:
+        return data if isinstance(data, dict) else {}
+    if not isinstance(data, str):
+        return {}  # a cookie-backend session from before a backend switch
+    session = SESSION_STORE.get(data)
+    if session is None:
+        return {}
+    session[SESSION_ID_KEY] = data
+    return session
 
 
 def set_session_data(response: Response, data: dict) -> None:
+    if SESSION_STORE is None:
+        value = serializer.dumps(data)
+    else:
+        data = dict(data)
+        sid = data.pop(SESSION_ID_KEY, None) or secrets.token_urlsafe(24)
+        SESSION_STORE.set(sid, data)
+        value = serializer.dumps(sid)
     response.set_cookie(
         key=SESSION_COOKIE,
-        value=serializer.dumps(data),
+        value=value,
         httponly=True,
         max_age=SESSION_MAX_AGE,
         samesite="lax",
     )
 
 
+def clear_session_data(response: Response, data: dict) -> None:
+    if SESSION_STORE is not None and data.get(SESSION_ID_KEY):
+        SESSION_STORE.delete(data[SESSION_ID_KEY])
+    response.delete_cookie(SESSION_COOKIE)
+
+
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
+def _upload_ext(content_type: Optional[str]) -> str:
+    return ".png" if content_type and "image/png" in content_type else ".jpg"
+
+
+def save_upload_to_file(upload: UploadFile, dest_dir: Path) -> Path:
+    """
+    Streams a multipart upload to dest_dir in UPLOAD_CHUNK_SIZE chunks,
+    returns the saved Path. Blocking; call via run_in_threadpool.
+    """
+    filename = f"{uuid.uuid4().hex}{_upload_ext(upload.content_type)}"
+    out_path = dest_dir / filename
+    upload.file.seek(0)
+    with out_path.open("wb") as fh:
+        shutil.copyfileobj(upload.file, fh, UPLOAD_CHUNK_SIZE)
+    return out_path
+
+
 def save_data_url_to_file(data_url: str, dest_dir: Path) -> Path:
     """
     Accepts a data URL like 'data:image/jpeg;base64,...', saves it to dest_dir,
@@ -80,24 +440,104 @@ def save_data_url_to_file(data_url: str, dest_dir: Path) -> Path:
     """
     header, b64 = data_url.split(",", 1)
     # crude content-type sniff
-    ext = ".jpg"
-    if "image/png" in header:
-        ext = ".png"
-    filename = f"{uuid.uuid4().hex}{ext}"
+    filename = f"{uuid.uuid4().hex}{_upload_ext(header)}"
     out_path = dest_dir / filename
     out_path.write_bytes(base64.b64decode(b64))
     return out_path
 
 
-def file_to_data_url(path: Path) -> str:
+def normalize_upload(saved_path: Path) -> Tuple[Path, Path]:
     """
-    Loads a file and returns a data URL (defaults to image/jpeg unless .png).
+    Replaces a raw upload with its print crop and preview thumbnail
+    (see utils.normalize_photo); returns (print_path, thumb_path).
+    Blocking; call via run_in_threadpool.
     """
-    mime = "image/jpeg"
-    if path.suffix.lower() == ".png":
-        mime = "image/png"
-    b64 = base64.b64encode(path.read_bytes()).decode("ascii")
-    return f"data:{mime};base64,{b64}"
+    print_path = saved_path.with_name(f"{saved_path.stem}_print.jpg")
+    thumb_path = saved_path.with_name(f"{saved_path.stem}_thumb{THUMB_EXT}")
+    try:
+        normalize_photo(saved_path, print_path, thumb_path)
+    finally:
+        saved_path.unlink(missing_ok=True)
+    return print_path, thumb_path
+
+
+def discard_session_photo(session: dict) -> None:
+    """Forget the session's photo and delete its files."""
+    for key in ("photo_path", "preview_path"):
+        old = session.pop(key, None)
+        if old:
+            try:
+                (UPLOAD_DIR / Path(old).name).unlink(missing_ok=True)
+            except Exception:
+                pass
+
+
+def end_session_files(session: dict) -> None:
+    """
+    Session is over: delete its photo unless a running job still needs it
+    (the sweeper collects that one later).
+    """
+    job = PRINT_JOBS.get(session.get("job_id") or "")
+    if job is None or job.get("status") != "processing":
+        discard_session_photo(session)
+
+
+def parse_encoding(spec: Optional[str]) -> BadgeEncoding:
+    """Per-job output encoding; raises ValueError on an unknown spec."""
+    return BadgeEncoding.parse(spec) if spec else BADGE_ENCODING
+
+
+def print_dedup_key(
+    key: Optional[str], session: dict, encoding: BadgeEncoding, printer: Optional[str]
+) -> Tuple[str, float]:
+    """
+    (dedup key, window) for a /print submission: the client's idempotency
+    key if it sent one, otherwise a hash of what would be printed. Client
+    keys are scoped to the session's photo (unique per upload), so another
+    session reusing the same key cannot take over that job.
+    """
+    if key:
+        scoped = json.dumps([key, session["photo_path"]])
+        return f"key:{hashlib.sha256(scoped.encode()).hexdigest()}", JOB_TTL
+    inputs = [session["formdata"], session["photo_path"], encoding.spec, printer]
+    digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+    return f"inputs:{digest}", PRINT_DEDUP_WINDOW
+
+
+def is_front_desk(request: Request) -> bool:
+    """True if the request carries the configured X-Vip-Token."""
+    token = request.headers.get("x-vip-token", "")
+    return bool(VIP_TOKEN) and secrets.compare_digest(token, VIP_TOKEN)
+
+
+def kiosk_id(request: Request) -> str:
+    """Scheduler fairness key: X-Kiosk-Id when the kiosk sends one, else its IP."""
+    return request.headers.get("x-kiosk-id") or (
+        request.client.host if request.client else "unknown"
+    )
+
+
+async def set_job(job_id: str, **fields) -> None:
+    """Update a job in the store and push the new state to live subscribers."""
+    job = await run_in_threadpool(PRINT_JOBS.update, job_id, **fields)
+    JOB_EVENTS.publish(job_id, job)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+def _sse_event(event: str, data: str) -> str:
+    lines = "".join(f"data: {line}\n" for line in data.splitlines())
+    return f"event: {event}\n{lines}\n"
+
+
+def archive_badge(data: bytes, path: Path) -> None:
+    """Keeps a copy of a printed badge (temp file + rename). Blocking."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(path, data)
 
 
 # -----------------------------------------------------------------------------
@@ -108,6 +548,29 @@ async def health():
     return {"ok": True}
 
 
+@app.get("/printers")
+async def printers():
+    """Per-printer queue depth, health and throughput."""
+    return PRINTERS.stats()
+
+
+@app.get("/admin/scheduler")
+async def scheduler_state(request: Request):
+    """Running and queued jobs in dispatch order, dispatch counts and waits."""
+    if not is_front_desk(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    return {**SCHEDULER.stats(), "journal": await run_in_threadpool(JOB_QUEUE.counts)}
+
+
+@app.get("/metrics")
+async def metrics():
+    # Only store and disk I/O leaves the loop: the other gauges read scheduler
+    # and printer state that the event loop owns.
+    await run_in_threadpool(measure_blocking_gauges)
+    body = METRICS.render()
+    return Response(body, media_type=CONTENT_TYPE)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def welcome(request: Request):
     return templates.TemplateResponse("welcome.html", {"request": request})
@@ -142,6 +605,7 @@ async def form_post(
     session["formdata"] = formdata
     # clear any previous photo if user is restarting
     session.pop("photo_path", None)
+    session.pop("preview_path", None)
     response = RedirectResponse("/photo", status_code=status.HTTP_303_SEE_OTHER)
     set_session_data(response, session)
     return response
@@ -163,18 +627,37 @@ async def photo_get(request: Request):
 
 
 @app.post("/photo", response_class=HTMLResponse)
-async def photo_post(request: Request, photo_data: str = Form(...)):
+async def photo_post(
+    request: Request,
+    photo: Optional[UploadFile] = File(None),
+    photo_data: Optional[str] = Form(None),
+):
     """
     Save the captured photo to disk; store only a small path in the cookie.
+    Prefers the binary multipart `photo` file (canvas.toBlob); the base64
+    `photo_data` field is kept as a fallback for older browsers.
     """
     session = get_session_data(request)
     if "formdata" not in session:
         return RedirectResponse("/form", status_code=status.HTTP_303_SEE_OTHER)
 
-    # Save large base64 image to a file to avoid cookie bloat
-    saved_path = save_data_url_to_file(photo_data, UPLOAD_DIR)
-    # Store a short static path usable by templates: "/static/uploads/<file>"
-    session["photo_path"] = f"/static/uploads/{saved_path.name}"
+    # Save the image to a file to avoid cookie bloat
+    if photo is not None and photo.filename:
+        saved_path = await run_in_threadpool(save_upload_to_file, photo, UPLOAD_DIR)
+    elif photo_data:
+        saved_path = save_data_url_to_file(photo_data, UPLOAD_DIR)
+    else:
+        return RedirectResponse("/photo", status_code=status.HTTP_303_SEE_OTHER)
+
+    # Keep only the fixed-size print crop and a small preview, not the raw frame
+    try:
+        print_path, thumb_path = await run_in_threadpool(normalize_upload, saved_path)
+    except (OSError, ValueError):
+        # not a decodable image
+        return RedirectResponse("/photo", status_code=status.HTTP_303_SEE_OTHER)
+    # Store short static paths usable by templates: "/static/uploads/<file>"
+    session["photo_path"] = f"/static/uploads/{print_path.name}"
+    session["preview_path"] = f"/static/uploads/{thumb_path.name}"
 
     response = RedirectResponse("/review", status_code=status.HTTP_303_SEE_OTHER)
     set_session_data(response, session)
@@ -191,7 +674,9 @@ async def review_get(request: Request):
         {
             "request": request,
             "formdata": session["formdata"],
-            "photo_path": session["photo_path"],  # used for preview <img src=...>
+            "photo_path": session["photo_path"],
+            "preview_path": session.get("preview_path"),  # preview <img src=...>
+            "print_key": uuid.uuid4().hex,  # one print per rendering of this page
         },
     )
 
@@ -221,13 +706,8 @@ async def review_edit(
 @app.post("/review/retake_photo")
 async def retake_photo(request: Request):
     session = get_session_data(request)
-    # Optional: delete previous file to keep storage tidy
-    old = session.pop("photo_path", None)
-    if old:
-        try:
-            (UPLOAD_DIR / Path(old).name).unlink(missing_ok=True)
-        except Exception:
-            pass
+    # Delete previous files to keep storage tidy
+    discard_session_photo(session)
     response = RedirectResponse("/photo", status_code=status.HTTP_303_SEE_OTHER)
     set_session_data(response, session)
     return response
@@ -237,46 +717,198 @@ async def retake_photo(request: Request):
 @app.get("/status", response_class=HTMLResponse)
 async def status_partial(request: Request):
     session = get_session_data(request)
-    job_id = session.get("job_id")
-    job = PRINT_JOBS.get(job_id or "", {"status": "idle", "step": "idle"})
+    job_id = session.get("job_id") or ""
+    job = await run_in_threadpool(PRINT_JOBS.get, job_id)
+    # The job version changes on every write, so it fully identifies the fragment
+    etag = f'"{job_id}-{job["version"]}"' if job else '"idle"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
     return templates.TemplateResponse(
         "partials/_status_block.html",
-        {"request": request, "job": job},
+        {"request": request, "job": job or {"status": "idle", "step": "idle"}},
+        headers=headers,
+    )
+
+
+# --- SSE push of the same fragment; polling above stays as the fallback ---
+@app.get("/status/stream")
+async def status_stream(request: Request):
+    session = get_session_data(request)
+    job_id = session.get("job_id") or ""
+    fragment = templates.get_template("partials/_status_block.html")
+
+    async def events():
+        with JOB_EVENTS.subscribe(job_id) as queue:
+            job = await run_in_threadpool(PRINT_JOBS.get, job_id) or {
+                "status": "idle",
+                "step": "idle",
+            }
+            last = None
+            while True:
+                state = (job.get("status"), job.get("step"))
+                if state != last:
+                    last = state
+                    yield _sse_event("status", fragment.render(request=request, job=job))
+                else:
+                    yield ": ping\n\n"
+                if job.get("status") != "processing":
+                    break
+                try:
+                    job = await asyncio.wait_for(queue.get(), STATUS_STREAM_RESYNC)
+                except asyncio.TimeoutError:
+                    job = await run_in_threadpool(PRINT_JOBS.get, job_id) or job
+                if await request.is_disconnected():
+                    break
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @app.post("/print")
-async def print_card(request: Request, background: BackgroundTasks):
+async def print_card(
+    request: Request,
+    background: BackgroundTasks,
+    output_format: Optional[str] = Form(None),
+    printer: Optional[str] = Form(None),
+    priority: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Form(None),
+):
     session = get_session_data(request)
     if "formdata" not in session or "photo_path" not in session:
         return RedirectResponse("/form", status_code=status.HTTP_303_SEE_OTHER)
+    try:
+        encoding = parse_encoding(output_format)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if printer and printer not in PRINTERS.slots:
+        return JSONResponse({"error": f"unknown printer {printer!r}"}, status_code=400)
+    if priority is None:
+        priority = "reprint" if session.get("job_id") else "walkup"
+    elif priority == "vip":
+        if not is_front_desk(request):
+            return JSONResponse({"error": "vip priority not allowed"}, status_code=403)
+    elif priority not in ("reprint", "walkup"):
+        return JSONResponse({"error": f"unknown priority {priority!r}"}, status_code=400)
 
-    # Create job & persist id in session
+    # Journal the job before answering, leased to this worker. A duplicate
+    # submission gets the job its first submission created.
     job_id = str(uuid.uuid4())
-    PRINT_JOBS[job_id] = {
+    dedup_key, window = print_dedup_key(
+        idempotency_key or request.headers.get("idempotency-key"),
+        session,
+        encoding,
+        printer,
+    )
+    job = {
         "status": "processing",
         "step": "queued",
+        "photo_path": session["photo_path"],
+        "encoding": encoding.spec,
+        "printer": printer,
+        "priority": priority,
         "badge_path": None,
         "error": None,
     }
-    session["job_id"] = job_id
+    task = {
+        "job_id": job_id,
+        "payload": {
+            "job": job,
+            "owner": kiosk_id(request),
+            "formdata": session["formdata"],
+        },
+        "steps": [],
+    }
+    queued_id = await run_in_threadpool(
+        JOB_QUEUE.enqueue,
+        job_id,
+        "print",
+        task["payload"],
+        WORKER_ID,
+        JOB_LEASE,
+        dedup_key,
+        window,
+    )
+    duplicate = queued_id != job_id
+    if not duplicate:
+        await run_in_threadpool(PRINT_JOBS.create, job_id, job)
+    session["job_id"] = queued_id
 
     # Redirect immediately to confirm page
     response = RedirectResponse("/confirm", status_code=status.HTTP_303_SEE_OTHER)
     set_session_data(response, session)
 
-    # Kick off background pipeline
-    background.add_task(
-        simulate_print_pipeline, job_id, session["formdata"], session["photo_path"]
-    )
+    # Queue the pipeline behind the scheduler
+    if not duplicate:
+        background.add_task(run_print_task, task)
     return response
 
 
+# --- Roster imports (see app/batch.py for the CLI) ---
+@app.post("/batch", status_code=status.HTTP_202_ACCEPTED)
+async def batch_post(
+    background: BackgroundTasks,
+    roster: UploadFile = File(...),
+    photo_dir: str = Form(...),
+    output_format: Optional[str] = Form(None),
+):
+    """
+    Accepts a CSV/JSONL roster plus a photo directory (relative to
+    BATCH_PHOTO_ROOT) and renders every badge in the background.
+    """
+    root = BATCH_PHOTO_ROOT.resolve()
+    photos = (root / photo_dir).resolve()
+    if not photos.is_relative_to(root) or not photos.is_dir():
+        return JSONResponse({"error": "unknown photo_dir"}, status_code=400)
+    try:
+        rows = parse_roster((await roster.read()).decode("utf-8-sig"))
+    except ValueError as e:
+        return JSONResponse({"error": f"invalid roster: {e}"}, status_code=400)
+    try:
+        encoding = parse_encoding(output_format)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    job_id = str(uuid.uuid4())
+    await run_in_threadpool(
+        PRINT_JOBS.create,
+        job_id,
+        {
+            "kind": "batch",
+            "status": "processing",
+            "step": "rendering",
+            "total": len(rows),
+            "done": 0,
+            "failed": 0,
+            "errors": [],
+            "encoding": encoding.spec,
+            "badge_path": None,
+            "error": None,
+        },
+    )
+    background.add_task(run_batch_job, job_id, rows, photos, encoding)
+    return {"job_id": job_id, "total": len(rows), "status_url": f"/batch/{job_id}"}
+
+
+@app.get("/batch/{job_id}")
+async def batch_status(job_id: str):
+    job = await run_in_threadpool(PRINT_JOBS.get, job_id)
+    if job is None or job.get("kind") != "batch":
+        return JSONResponse({"error": "unknown batch"}, status_code=404)
+    return job
+
+
 @app.get("/confirm", response_class=HTMLResponse)
 async def confirm_get(request: Request):
     session = get_session_data(request)
     job_id = session.get("job_id")
-    job = PRINT_JOBS.get(job_id or "", {"status": "processing", "step": "queued"})
+    job = await run_in_threadpool(PRINT_JOBS.get, job_id or "") or {
+        "status": "processing",
+        "step": "queued",
+    }
     return templates.TemplateResponse("confirm.html", {"request": request, "job": job})
 
 
@@ -286,52 +918,322 @@ async def feedback_post(
 ):
     # TODO: Persist to DB or file as needed
     print(f"Received feedback: {rating} stars, comments: {comments}")
+    session = get_session_data(request)
+    await run_in_threadpool(end_session_files, session)
     response = RedirectResponse("/", status_code=status.HTTP_303_SEE_OTHER)
-    response.delete_cookie(SESSION_COOKIE)
+    clear_session_data(response, session)
     return response
 
 
 @app.post("/reset")
 async def reset_process(request: Request):
+    session = get_session_data(request)
+    await run_in_threadpool(end_session_files, session)
     response = RedirectResponse("/", status_code=status.HTTP_303_SEE_OTHER)
-    response.delete_cookie(SESSION_COOKIE)
+    clear_session_data(response, session)
     return response
 
 
 # -----------------------------------------------------------------------------
 # Background pipeline (simulate compose + print)
 # -----------------------------------------------------------------------------
-async def simulate_print_pipeline(job_id: str, formdata: dict, photo_path_str: str):
-    # Step 1: image processing
-    PRINT_JOBS[job_id]["step"] = "image_processing"
-    await asyncio.sleep(0.3)  # simulate latency
+async def render_in_worker(
+    job_id: str, formdata: dict, photo_path: Path, encoding: BadgeEncoding
+) -> bytes:
+    """
+    Queues the render for an app.worker process and waits for it; returns
+    the encoded badge. The rendered file is only a hand-off and is removed.
+    """
+    render_id = uuid.uuid4().hex  # fresh per attempt, so resumed jobs re-render
+    task_id = f"render:{render_id}"
+    await run_in_threadpool(
+        JOB_QUEUE.enqueue,
+        task_id,
+        "render",
+        {
+            "job_id": job_id,
+            "out_name": render_id,
+            "formdata": formdata,
+            "photo_path": str(photo_path),
+            "encoding": encoding.spec,
+            "outdir": str(RENDER_SPOOL_DIR),
+        },
+    )
+    out_path = RENDER_SPOOL_DIR / f"{render_id}_badge{encoding.ext}"
+
+    async def abandon(reason: str) -> None:
+        # a worker still rendering it can no longer complete it and drops its file
+        if not await run_in_threadpool(JOB_QUEUE.cancel, task_id, reason):
+            await run_in_threadpool(out_path.unlink, missing_ok=True)  # just finished
+
+    deadline = time.monotonic() + RENDER_TIMEOUT
+    delay = 0.02
+    try:
+        while True:
+            state, error = await run_in_threadpool(JOB_QUEUE.state, task_id) or (
+                "failed",
+                "render task lost",
+            )
+            if state == "done":
+                break
+            if state == "failed":
+                raise RuntimeError(error or "render failed")
+            if time.monotonic() > deadline:
+                await abandon("timed out waiting for a render worker")
+                raise RuntimeError(
+                    "Aucun moteur de rendu disponible, veuillez réessayer."
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.2)
+    except asyncio.CancelledError:
+        await abandon("cancelled")
+        raise
+
+    def read_and_remove() -> bytes:
+        data = out_path.read_bytes()
+        out_path.unlink()
+        return data
+
+    return await run_in_threadpool(read_and_remove)
+
+
+async def keep_lease(job_id: str, pipeline: asyncio.Task) -> None:
+    while True:
+        await asyncio.sleep(JOB_LEASE / 3)
+        if not await run_in_threadpool(
+            JOB_QUEUE.heartbeat, job_id, WORKER_ID, JOB_LEASE
+        ):
+            # we stalled past the lease: another worker may resume the job, so
+            # stop ours rather than print the badge twice
+            log.warning("lost the lease on print job %s, abandoning it", job_id)
+            pipeline.cancel()
+            return
+
+
+async def run_print_task(task: dict) -> None:
+    """
+    Runs a journaled print job: waits (step "queued") for a scheduler slot,
+    runs the pipeline under a heartbeated lease, then settles the task.
+    """
+    job_id, payload = task["job_id"], task["payload"]
+    job = payload["job"]
+
+    async def run() -> None:
+        async with SCHEDULER.slot(job_id, job["priority"], payload["owner"]):
+            await simulate_print_pipeline(
+                job_id,
+                payload["formdata"],
+                job["photo_path"],
+                BadgeEncoding.parse(job["encoding"]),
+                job["printer"],
+                done_steps=frozenset(task["steps"]),
+            )
+
+    pipeline = asyncio.create_task(run())
+    heartbeat = asyncio.create_task(keep_lease(job_id, pipeline))
+    try:
+        await pipeline
+    except asyncio.CancelledError:
+        if not heartbeat.done():
+            pipeline.cancel()
+            raise  # we were cancelled ourselves
+        return  # lease lost: the job is no longer ours to settle
+    except LeaseLost:
+        log.warning("lost the lease on print job %s before printing", job_id)
+        return
+    finally:
+        heartbeat.cancel()
+    result = await run_in_threadpool(PRINT_JOBS.get, job_id) or {}
+    if result.get("status") == "error":
+        error = result.get("error") or "error"
+        await run_in_threadpool(JOB_QUEUE.fail, job_id, WORKER_ID, error)
+    else:
+        await run_in_threadpool(JOB_QUEUE.complete, job_id, WORKER_ID)
+
+
+RESUMED_TASKS: set = set()  # strong refs to resumed jobs' asyncio tasks
+
+
+def _claim_interrupted() -> Optional[dict]:
+    task = JOB_QUEUE.claim(WORKER_ID, JOB_LEASE, kind="print")
+    if task is not None and PRINT_JOBS.get(task["job_id"]) is None:
+        # the memory job store restarted with us
+        PRINT_JOBS.create(task["job_id"], task["payload"]["job"])
+    return task
+
+
+async def resume_print_jobs() -> int:
+    """Claims interrupted print jobs (lease expired) and restarts them."""
+    resumed = 0
+    while True:
+        task = await run_in_threadpool(_claim_interrupted)
+        if task is None:
+            return resumed
+        job_id = task["job_id"]
+        if task["attempts"] > JOB_MAX_ATTEMPTS:
+            error = "Impression interrompue trop de fois, veuillez réessayer."
+            await run_in_threadpool(JOB_QUEUE.fail, job_id, WORKER_ID, error)
+            await set_job(job_id, status="error", error=error, step="failed")
+            continue
+        await set_job(
+            job_id, status="processing", step="queued", attempts=task["attempts"]
+        )
+        resumed_task = asyncio.create_task(run_print_task(task))
+        RESUMED_TASKS.add(resumed_task)
+        resumed_task.add_done_callback(RESUMED_TASKS.discard)
+        resumed += 1
+
+
+async def recover_print_jobs_forever() -> None:
+    # leases of this host's dead processes
+    await run_in_threadpool(JOB_QUEUE.release_orphans, WORKER_ID)
+    while True:
+        try:
+            resumed = await resume_print_jobs()
+            if resumed:
+                log.info("resumed %d interrupted print job(s)", resumed)
+            await run_in_threadpool(JOB_QUEUE.prune)
+        except Exception:
+            log.exception("print job recovery failed")
+        await asyncio.sleep(JOB_LEASE / 2)
+
+
+async def simulate_print_pipeline(
+    job_id: str,
+    formdata: dict,
+    photo_path_str: str,
+    encoding: BadgeEncoding = BADGE_ENCODING,
+    printer: Optional[str] = None,
+    done_steps: frozenset = frozenset(),
+):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        if "printed" in done_steps:
+            # resumed after a crash that happened once the badge was out
+            await set_job(job_id, status="success", step="done")
+            outcome = "success"
+            return
+
+        # Step 1: image processing
+        await set_job(job_id, step="image_processing")
+        with PIPELINE_STEP_SECONDS.time(step="image_processing"):
+            await asyncio.sleep(0.3)  # simulate latency
+            disk_path = UPLOAD_DIR / Path(photo_path_str).name
+
+            # Unchanged reprint? Reuse the cached badge, go straight to the printer
+            cache_key = badge = None
+            if RENDER_CACHE.enabled:
+                cache_key = await run_in_threadpool(
+                    RENDER_CACHE.key, formdata, disk_path, encoding
+                )
+                badge = await run_in_threadpool(
+                    RENDER_CACHE.get, cache_key, encoding.ext
+                )
+
+        cache_hit = badge is not None
+        if not cache_hit:
+            # Step 2: compose badge
+            await set_job(job_id, step="composing_badge")
+            with PIPELINE_STEP_SECONDS.time(step="composing_badge"):
+                # Hand the saved file straight to the renderer (no re-encode);
+                # the encoded badge comes back as bytes, never hits disk
+                if RENDER_BACKEND == "worker":
+                    badge = await render_in_worker(
+                        job_id, formdata, disk_path, encoding
+                    )
+                else:
+                    badge = await RENDER_POOL.run(
+                        render_badge, formdata, str(disk_path), encoding
+                    )
+                if cache_key:
+                    await run_in_threadpool(
+                        RENDER_CACHE.put, cache_key, badge, encoding.ext
+                    )
+                await asyncio.sleep(0.3)
+
+        badge_path = None
+        if ARCHIVE_BADGES:
+            archive_path = OUTPUT_DIR / f"{job_id}_badge{encoding.ext}"
+            await run_in_threadpool(archive_badge, badge, archive_path)
+            badge_path = str(archive_path)
+        await set_job(
+            job_id, badge_path=badge_path, badge_bytes=len(badge), cache_hit=cache_hit
+        )
+
+        # Step 3: stream the in-memory badge to a printer (queues per printer)
+        async def dispatched(name: str) -> None:
+            await set_job(job_id, step="printing", printer=name)
+
+        # Last chance to notice a lost lease before the badge is out
+        if not await run_in_threadpool(
+            JOB_QUEUE.heartbeat, job_id, WORKER_ID, JOB_LEASE
+        ):
+            raise LeaseLost(job_id)
+        with PIPELINE_STEP_SECONDS.time(step="printing"):
+            printer = await PRINTERS.send(
+                badge, job_id, encoding.ext, printer, on_dispatch=dispatched
+            )
+        await run_in_threadpool(JOB_QUEUE.mark_step, job_id, WORKER_ID, "printed")
+
+        await set_job(
+            job_id,
+            status="success",
+            step="done",
+            printer=printer,
+            printer_stats=PRINTERS.stats()[printer],
+        )
+        outcome = "success"
+    except LeaseLost:
+        raise  # another worker owns the job now; leave its state alone
+    except RenderQueueFull:
+        outcome = "rejected"
+        await set_job(
+            job_id,
+            status="error",
+            error="Trop d’impressions en cours, veuillez réessayer.",
+            step="failed",
+        )
+    except Exception as e:
+        await set_job(job_id, status="error", error=str(e), step="failed")
+    finally:
+        JOB_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+
+
+async def run_batch_job(
+    job_id: str, rows: list, photo_dir: Path, encoding: BadgeEncoding
+):
+    outdir = OUTPUT_DIR / "batch" / job_id
+    errors = []
+    await set_job(job_id, badge_path=str(outdir))  # keeps the sweeper away
+
+    async def progress(done: int, total: int, row: dict, error: Optional[str]) -> None:
+        if error:
+            errors.append([row.get("employee_number", ""), error])
+        await set_job(
+            job_id, done=done, failed=len(errors), errors=errors[-BATCH_MAX_ERRORS:]
+        )
+
+    async def run_scheduled(fn, *args):
+        # each row competes for a slot at batch priority, behind walk-ups
+        async with SCHEDULER.slot(job_id, "batch", owner=f"batch:{job_id}"):
+            return await RENDER_POOL.run(fn, *args)
 
     try:
-        # Step 2: compose badge
-        PRINT_JOBS[job_id]["step"] = "composing_badge"
-
-        # utils.generate_badge_png expects a base64 data URL,
-        # so convert the saved file to data URL here:
-        disk_path = (UPLOAD_DIR / Path(photo_path_str).name)
-        photo_data_url = file_to_data_url(disk_path)
-
-        badge_path = generate_badge_png(formdata, photo_data_url)
-        PRINT_JOBS[job_id]["badge_path"] = badge_path
-        await asyncio.sleep(0.3)
-
-        # Step 3: send to printer (stub)
-        PRINT_JOBS[job_id]["step"] = "printing"
-        # Example (Windows): quick print via Paint
-        # import subprocess
-        # subprocess.run(['mspaint.exe', '/p', badge_path], check=False)
-        await asyncio.sleep(0.8)
-
-        PRINT_JOBS[job_id]["status"] = "success"
-        PRINT_JOBS[job_id]["step"] = "done"
+        concurrency = BATCH_CONCURRENCY or max(1, RENDER_POOL.workers // 2)
+        result = await render_batch_async(
+            rows, photo_dir, run_scheduled, str(outdir), concurrency, progress,
+            encoding,
+        )
+        await set_job(
+            job_id,
+            status="error" if result.failed else "success",
+            error=f"{len(result.failed)} badge(s) failed" if result.failed else None,
+            step="done",
+            badge_path=str(outdir),
+        )
     except Exception as e:
-        PRINT_JOBS[job_id]["status"] = "error"
-        PRINT_JOBS[job_id]["error"] = str(e)
-        PRINT_JOBS[job_id]["step"] = "failed"
+        await set_job(job_id, status="error", error=str(e), step="failed")
 
 
 # -----------------------------------------------------------------------------
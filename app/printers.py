@@ -0,0 +1,410 @@
+import asyncio
+import os
+import shlex
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import (
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import parse_qsl, urlsplit
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.utils import atomic_write_bytes
+
+
+class PrinterError(Exception):
+    """The printer could not take the job."""
+
+
+class PrinterBackend(ABC):
+    """
+    Hands an encoded badge (bytes in memory) to a printer. send() streams
+    the buffer straight to the device/spooler; nothing touches disk unless
+    the backend itself is file based.
+    """
+
+    name = "printer"
+
+    @abstractmethod
+    async def send(self, data: bytes, job_id: str, ext: str = ".png") -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class SimulatedPrinter(PrinterBackend):
+    """Stand-in that only waits, like the original pipeline stub."""
+
+    name = "simulated"
+
+    def __init__(self, delay: float = 0.8):
+        self.delay = delay
+
+    async def send(self, data: bytes, job_id: str, ext: str = ".png") -> None:
+        await asyncio.sleep(self.delay)
+
+
+class FileSinkPrinter(PrinterBackend):
+    """
+    Writes each badge to a file-like sink (e.g. an open device node) or,
+    given a directory, to <dir>/<job_id>.<ext> via temp file + rename so a
+    watching spooler never picks up a partial file.
+    """
+
+    name = "file"
+
+    def __init__(self, target: Union[str, os.PathLike, BinaryIO]):
+        self.target = target
+
+    def _write(self, data: bytes, job_id: str, ext: str) -> None:
+        if hasattr(self.target, "write"):
+            self.target.write(data)
+            self.target.flush()
+            return
+        directory = Path(self.target)
+        directory.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(directory / f"{job_id}{ext}", data)
+
+    async def send(self, data: bytes, job_id: str, ext: str = ".png") -> None:
+        try:
+            await run_in_threadpool(self._write, data, job_id, ext)
+        except OSError as e:
+            raise PrinterError(f"{self.target}: {e}") from e
+
+
+class PipePrinter(PrinterBackend):
+    """Pipes each badge into a command's stdin (e.g. a vendor print tool)."""
+
+    name = "pipe"
+
+    def __init__(self, argv, timeout: float = 30):
+        self.argv = list(argv)
+        self.timeout = timeout
+
+    def command(self, job_id: str) -> List[str]:
+        return self.argv
+
+    async def send(self, data: bytes, job_id: str, ext: str = ".png") -> None:
+        argv = self.command(job_id)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as e:  # e.g. the command is not installed
+            raise PrinterError(f"{argv[0]}: {e}") from e
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(data), self.timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise PrinterError(f"{argv[0]} timed out")
+        except OSError as e:  # e.g. it exited before reading stdin
+            raise PrinterError(f"{argv[0]}: {e}") from e
+        if proc.returncode != 0:
+            detail = stderr.decode(errors="replace").strip()
+            raise PrinterError(f"{argv[0]} exited {proc.returncode}: {detail}")
+
+
+class LpPrinter(PipePrinter):
+    """Submits each badge to CUPS with `lp` (badge on stdin, job titled job_id)."""
+
+    name = "lp"
+
+    def __init__(
+        self,
+        destination: Optional[str] = None,
+        options: Optional[Dict[str, str]] = None,
+        timeout: float = 30,
+    ):
+        argv = ["lp"]
+        if destination:
+            argv += ["-d", destination]
+        for key, value in (options or {}).items():
+            argv += ["-o", f"{key}={value}" if value else key]
+        super().__init__(argv, timeout)
+
+    def command(self, job_id: str) -> List[str]:
+        return self.argv + ["-t", job_id, "-"]
+
+
+# PJL Universal Exit Language: resets the printer's interpreter between jobs,
+# which is what lets several jobs share one raw port 9100 connection.
+UEL = b"\x1b%-12345X"
+
+
+def pjl_wrap(data: bytes, job_id: str) -> bytes:
+    name = job_id.replace('"', "")
+    return (
+        UEL + f'@PJL JOB NAME="{name}"\r\n'.encode("ascii", "replace")
+        + data
+        + UEL + f'@PJL EOJ NAME="{name}"\r\n'.encode("ascii", "replace")
+        + UEL
+    )
+
+
+class SocketPrinter(PrinterBackend):
+    """
+    Raw TCP / JetDirect (port 9100). Jobs are PJL-framed and written over
+    one persistent connection, serialized by a lock; the connection is
+    reopened when the printer dropped it or it sat idle too long.
+    reuse=False opens one connection per job and sends the bare badge.
+    """
+
+    name = "socket"
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 9100,
+        timeout: float = 10,
+        reuse: bool = True,
+        idle_timeout: float = 60,
+    ):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reuse = reuse
+        self.idle_timeout = idle_timeout
+        self._lock = asyncio.Lock()
+        self._conn: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._last_used = 0.0
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+
+    async def _close(self, writer: asyncio.StreamWriter, abort: bool = False) -> None:
+        # A graceful close waits for unsent data to flush, which never
+        # happens on a stalled printer: abort on errors, bound it otherwise.
+        if not abort:
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), self.timeout)
+                return
+            except (OSError, asyncio.TimeoutError):
+                pass
+        writer.transport.abort()
+
+    async def _drop(self, abort: bool = False) -> None:
+        if self._conn is None:
+            return
+        _, writer = self._conn
+        self._conn = None
+        await self._close(writer, abort)
+
+    async def _write(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(data)
+        await asyncio.wait_for(writer.drain(), self.timeout)
+
+    async def _send_reused(self, data: bytes) -> None:
+        async with self._lock:
+            stale = time.monotonic() - self._last_used > self.idle_timeout
+            if self._conn and (stale or self._conn[0].at_eof()):
+                await self._drop()
+            reused = self._conn is not None
+            if not reused:
+                self._conn = await self._connect()
+            try:
+                await self._write(self._conn[1], data)
+            except (OSError, asyncio.TimeoutError):
+                await self._drop(abort=True)
+                if not reused:
+                    raise
+                # the printer closed the kept-alive socket under us: retry once
+                self._conn = await self._connect()
+                await self._write(self._conn[1], data)
+            self._last_used = time.monotonic()
+
+    async def send(self, data: bytes, job_id: str, ext: str = ".png") -> None:
+        try:
+            if self.reuse:
+                await self._send_reused(pjl_wrap(data, job_id))
+                return
+            _, writer = await self._connect()
+            try:
+                await self._write(writer, data)
+            except BaseException:
+                await self._close(writer, abort=True)
+                raise
+            await self._close(writer)
+        except (OSError, asyncio.TimeoutError) as e:
+            if self.reuse:
+                async with self._lock:
+                    await self._drop(abort=True)
+            raise PrinterError(f"{self.host}:{self.port}: {str(e) or 'timeout'}") from e
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._drop()
+
+
+def make_printer(url: str) -> PrinterBackend:
+    """
+    simulated://[?delay=0.8] | file:///spool/dir | pipe:<command line>
+    | lp://[destination][?option=value...] (CUPS)
+    | tcp://host[:9100][?reuse=0]  (raw/JetDirect; also jetdirect://)
+    """
+    if url.startswith("pipe:"):
+        return PipePrinter(shlex.split(url[len("pipe:"):]))
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    if parts.scheme == "simulated":
+        return SimulatedPrinter(float(query.get("delay", 0.8)))
+    if parts.scheme == "file":
+        return FileSinkPrinter(parts.path)
+    if parts.scheme == "lp":
+        return LpPrinter(parts.netloc or None, query)
+    if parts.scheme in ("tcp", "jetdirect"):
+        return SocketPrinter(
+            parts.hostname or "127.0.0.1",
+            parts.port or 9100,
+            reuse=query.get("reuse", "1") != "0",
+        )
+    raise ValueError(f"Unknown printer URL: {url!r}")
+
+
+class _PrinterSlot:
+    """One pool member: its backend, FIFO queue (lock) and health/throughput."""
+
+    def __init__(self, backend: PrinterBackend):
+        self.backend = backend
+        self.queue = asyncio.Lock()  # FIFO: jobs print one at a time, in order
+        self.pending = 0  # queued + printing
+        self.printed = 0
+        self.failed = 0
+        self.offline_until = 0.0
+        self.last_error: Optional[str] = None
+        self.completions: Deque[Tuple[float, float]] = deque()  # (done_at, seconds)
+
+    @property
+    def online(self) -> bool:
+        return time.monotonic() >= self.offline_until
+
+
+class PrinterPool:
+    """
+    Several printers behind one send(). Each printer has its own queue; a
+    job goes to its preferred (assigned) printer when that one is online,
+    otherwise to the online printer with the fewest pending jobs. A printer
+    that raises PrinterError is taken offline for `cooldown` seconds and the
+    job fails over to the next printer; jobs already queued on it follow.
+    """
+
+    def __init__(
+        self,
+        printers: Dict[str, PrinterBackend],
+        cooldown: float = 30,
+        window: float = 300,
+    ):
+        if not printers:
+            raise ValueError("PrinterPool needs at least one printer")
+        self.slots: Dict[str, _PrinterSlot] = {
+            name: _PrinterSlot(backend) for name, backend in printers.items()
+        }
+        self.cooldown = cooldown
+        self.window = window  # seconds of history behind the throughput figures
+
+    def pick(self, preferred: Optional[str] = None, exclude=()) -> Optional[str]:
+        candidates = [n for n in self.slots if n not in exclude]
+        if not candidates:
+            return None
+        online = [n for n in candidates if self.slots[n].online]
+        if preferred in online:
+            return preferred
+        # all offline: probe the one that has been down longest
+        if not online:
+            return min(candidates, key=lambda n: self.slots[n].offline_until)
+        return min(online, key=lambda n: (self.slots[n].pending, self.slots[n].printed))
+
+    async def send(
+        self,
+        data: bytes,
+        job_id: str,
+        ext: str = ".png",
+        preferred: Optional[str] = None,
+        on_dispatch: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> str:
+        """Prints on some printer and returns its name; PrinterError if none can."""
+        tried: List[str] = []
+        errors: List[str] = []
+        while True:
+            name = self.pick(preferred, tried)
+            if name is None:
+                raise PrinterError("; ".join(errors) or "no printer available")
+            tried.append(name)
+            slot = self.slots[name]
+            if on_dispatch is not None:
+                await on_dispatch(name)
+            slot.pending += 1
+            try:
+                async with slot.queue:
+                    if not slot.online and len(tried) < len(self.slots):
+                        errors.append(f"{name}: offline")
+                        continue  # went down while we waited in its queue
+                    started = time.monotonic()
+                    await slot.backend.send(data, job_id, ext)
+            except PrinterError as e:
+                slot.failed += 1
+                slot.last_error = str(e)
+                slot.offline_until = time.monotonic() + self.cooldown
+                errors.append(f"{name}: {e}")
+                continue
+            finally:
+                slot.pending -= 1
+            done = time.monotonic()
+            slot.printed += 1
+            slot.offline_until = 0.0
+            slot.completions.append((done, done - started))
+            return name
+
+    def stats(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        out = {}
+        for name, slot in self.slots.items():
+            while slot.completions and slot.completions[0][0] < now - self.window:
+                slot.completions.popleft()
+            recent = [seconds for _, seconds in slot.completions]
+            out[name] = {
+                "backend": slot.backend.name,
+                "online": slot.online,
+                "pending": slot.pending,
+                "printed": slot.printed,
+                "failed": slot.failed,
+                "last_error": slot.last_error,
+                "badges_per_min": round(len(recent) * 60 / self.window, 2),
+                "avg_print_seconds": (
+                    round(sum(recent) / len(recent), 3) if recent else None
+                ),
+            }
+        return out
+
+    async def close(self) -> None:
+        for slot in self.slots.values():
+            await slot.backend.close()
+
+
+def make_printer_pool(spec: str, cooldown: float = 30) -> PrinterPool:
+    """spec: "name=url,name=url" (see make_printer), or a single bare URL."""
+    printers: Dict[str, PrinterBackend] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, url = item.partition("=")
+        if not sep or "://" in name or name.startswith("pipe:"):
+            name, url = "default" if not printers else f"printer{len(printers)}", item
+        printers[name] = make_printer(url)
+    return PrinterPool(printers, cooldown)
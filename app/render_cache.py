@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from app.utils import (
+    DEFAULT_TEMPLATE_PATH, PNG_DEFAULT, BadgeEncoding, atomic_write_bytes,
+    layout_fingerprint,
+)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class RenderCache:
+    """
+    Content-addressed on-disk cache of rendered badges. The key covers the
+    formdata, the photo bytes, the output encoding and the layout fingerprint
+    (template version and layout constants), so a reprint of unchanged inputs
+    skips composition.
+    Total size is capped; least recently used entries are evicted first.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(
+        self,
+        formdata: Dict[str, str],
+        photo_path: Union[str, os.PathLike],
+        encoding: BadgeEncoding = PNG_DEFAULT,
+        template_path: Optional[str] = DEFAULT_TEMPLATE_PATH,
+    ) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps(formdata, sort_keys=True).encode("utf-8"))
+        digest.update(b"\0")
+        with open(photo_path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+        digest.update(layout_fingerprint(template_path).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(encoding.spec.encode("ascii"))
+        return digest.hexdigest()
+
+    def get(self, key: str, ext: str = ".png") -> Optional[bytes]:
+        """Returns the cached badge bytes, or None. Blocking."""
+        path = self.directory / f"{key}{ext}"
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock
+            data = path.read_bytes()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes, ext: str = ".png") -> str:
+        """Stores rendered badge bytes under key; returns the cache path."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{key}{ext}"
+        atomic_write_bytes(path, data)
+        os.utime(path)
+        self.evict()
+        return str(path.resolve())
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.startswith(".") and entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
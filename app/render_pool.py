@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.utils import RENDER_RESOURCES
+
+
+class RenderQueueFull(Exception):
+    """Raised when the render pool already holds its maximum of pending jobs."""
+
+
+def warm_render_worker() -> None:
+    # Load fonts once per worker process instead of on its first badge
+    RENDER_RESOURCES.fonts()
+
+
+def _run_and_report(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, int, Dict]:
+    # The template/font cache lives in each worker: send its counters back
+    return fn(*args, **kwargs), os.getpid(), RENDER_RESOURCES.stats()
+
+
+class RenderPool:
+    """
+    Runs CPU-heavy badge rendering off the event loop, on a process pool
+    (default) or a thread pool. At most `workers + max_queue` renders may be
+    pending at once; beyond that run() raises RenderQueueFull so callers can
+    shed load instead of piling up work.
+    """
+
+    def __init__(
+        self, kind: str = "process", workers: Optional[int] = None, max_queue: int = 16
+    ):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown render executor kind: {kind!r}")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+        self._resources: Dict[int, Dict[str, int]] = {}  # worker pid -> counters
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    @property
+    def full(self) -> bool:
+        return self.pending >= self.capacity
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn: never fork a process that is running an event loop
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_render_worker,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="render"
+                )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool; args must be picklable for processes."""
+        if self.full:
+            raise RenderQueueFull(f"{self.pending} renders pending")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, pid, resources = await loop.run_in_executor(
+                self._get_executor(), partial(_run_and_report, fn, *args, **kwargs)
+            )
+        finally:
+            self.pending -= 1
+        self._resources[pid] = resources
+        return result
+
+    def resource_stats(self) -> Dict[str, int]:
+        """Template/font cache hits and misses, summed over the workers."""
+        return {
+            key: sum(stats[key] for stats in self._resources.values())
+            for key in ("hits", "misses")
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,155 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+# Lower runs first. Walk-up kiosk jobs outrank bulk batch renders, reprints
+# (the badge is usually cached) and VIP jobs outrank fresh walk-ups.
+PRIORITIES = {"vip": 0, "reprint": 1, "walkup": 2, "batch": 3}
+
+
+@dataclass
+class _Ticket:
+    job_id: str
+    priority: str
+    owner: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    granted: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+
+
+class JobScheduler:
+    """
+    Admission control in front of rendering and printing. At most
+    `max_in_flight` jobs hold a slot at once; waiting jobs are served by
+    priority (PRIORITIES), and within one priority round-robin across
+    owners (kiosks, batch imports) so a single busy owner cannot starve the
+    others. State is per process, like the job events and metrics.
+
+        async with SCHEDULER.slot(job_id, "walkup", owner=kiosk_id):
+            ...render and print...
+    """
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max(1, max_in_flight)
+        # priority -> owner -> FIFO of tickets; owner order is the rotation
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {
+            p: OrderedDict() for p in PRIORITIES
+        }
+        self._running: Dict[int, _Ticket] = {}
+        self.dispatched = {p: 0 for p in PRIORITIES}
+        self.waited = {p: 0.0 for p in PRIORITIES}  # total seconds spent queued
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for owners in self._queues.values() for q in owners.values())
+
+    def _next(self) -> Optional[_Ticket]:
+        for priority in sorted(PRIORITIES, key=PRIORITIES.get):
+            owners = self._queues[priority]
+            while owners:
+                owner, tickets = next(iter(owners.items()))
+                ticket = tickets.popleft()
+                if tickets:
+                    owners.move_to_end(owner)  # their next job waits its turn
+                else:
+                    del owners[owner]
+                return ticket
+        return None
+
+    def _dispatch(self) -> None:
+        while len(self._running) < self.max_in_flight:
+            ticket = self._next()
+            if ticket is None:
+                return
+            if ticket.granted.done():
+                continue  # cancelled while queued, before slot() withdrew it
+            ticket.started_at = time.monotonic()
+            self._running[id(ticket)] = ticket
+            self.dispatched[ticket.priority] += 1
+            self.waited[ticket.priority] += ticket.started_at - ticket.enqueued_at
+            ticket.granted.set_result(None)
+
+    def _withdraw(self, ticket: _Ticket) -> None:
+        owners = self._queues[ticket.priority]
+        tickets = owners.get(ticket.owner)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del owners[ticket.owner]
+
+    def _release(self, ticket: _Ticket) -> None:
+        self._running.pop(id(ticket), None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self, job_id: str, priority: str = "walkup", owner: str = ""
+    ) -> AsyncIterator[None]:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority!r}")
+        ticket = _Ticket(job_id, priority, owner)
+        self._queues[priority].setdefault(owner, deque()).append(ticket)
+        self._dispatch()
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            if ticket.granted.cancelled():
+                self._withdraw(ticket)
+            else:
+                self._release(ticket)  # granted just as we were cancelled
+            raise
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def waiting(self) -> List[_Ticket]:
+        """Queued tickets in the order they will be dispatched."""
+        order = []
+        for priority in sorted(PRIORITIES, key=PRIORITIES.get):
+            queues = [list(q) for q in self._queues[priority].values()]
+            # interleave owners the way _next() will serve them
+            for round_ in itertools.zip_longest(*queues):
+                order.extend(t for t in round_ if t is not None)
+        return order
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": [
+                {
+                    "job_id": t.job_id,
+                    "priority": t.priority,
+                    "owner": t.owner,
+                    "running_seconds": round(now - t.started_at, 3),
+                }
+                for t in self._running.values()
+            ],
+            "queued": [
+                {
+                    "job_id": t.job_id,
+                    "priority": t.priority,
+                    "owner": t.owner,
+                    "waiting_seconds": round(now - t.enqueued_at, 3),
+                }
+                for t in self.waiting()
+            ],
+            "dispatched": dict(self.dispatched),
+            "avg_wait_seconds": {
+                p: round(self.waited[p] / self.dispatched[p], 3)
+                if self.dispatched[p]
+                else None
+                for p in PRIORITIES
+            },
+        }
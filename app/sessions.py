@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.storage import ExpiringLRU, SQLiteConnections
+
+# Server-side kiosk sessions (formdata, photo paths, job id), keyed by a random
+# session id; the cookie then only carries the signed id.
+Session = Dict
+
+
+class SessionStore(ABC):
+    """
+    Interface for server-side session data. Sessions expire ttl seconds
+    after their last save (like the cookie's max_age).
+    """
+
+    @abstractmethod
+    def get(self, sid: str) -> Optional[Session]:
+        ...
+
+    @abstractmethod
+    def set(self, sid: str, data: Session) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, sid: str) -> None:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local LRU with TTL: single worker only, lost on restart."""
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions: ExpiringLRU[Session] = ExpiringLRU(max_sessions, ttl)
+
+    def get(self, sid: str) -> Optional[Session]:
+        with self._lock:
+            data = self._sessions.get(sid)
+        # callers mutate their copy
+        return json.loads(json.dumps(data)) if data is not None else None
+
+    def set(self, sid: str, data: Session) -> None:
+        data = json.loads(json.dumps(data))
+        with self._lock:
+            self._sessions.put(sid, data)
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(sid)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite (WAL mode) backed store, shared by every worker process pointing
+    at the same file. Expired sessions are purged on write.
+    """
+
+    def __init__(self, path: Path, ttl: float = 3600):
+        self._db = SQLiteConnections(path)
+        self._conn = self._db.get
+        self.path = self._db.path
+        self.ttl = ttl
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " sid TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+            )
+
+    def get(self, sid: str) -> Optional[Session]:
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND updated_at >= ?",
+            (sid, time.time() - self.ttl),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid: str, data: Session) -> None:
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, updated_at)"
+                " VALUES (?, ?, ?)",
+                (sid, json.dumps(data), now),
+            )
+
+    def delete(self, sid: str) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+
+def make_session_store(
+    backend: str, db_path: Path, ttl: float, max_sessions: int
+) -> Optional[SessionStore]:
+    """None for the "cookie" backend (the whole session lives in the cookie)."""
+    if backend == "cookie":
+        return None
+    if backend == "memory":
+        return MemorySessionStore(max_sessions=max_sessions, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteSessionStore(db_path, ttl=ttl)
+    raise ValueError(f"Unknown session backend: {backend!r}")
@@ -0,0 +1,140 @@
+"""
+Local stand-in for a raw port 9100 printer, for development and tests:
+
+    python -m app.spooler --port 9100 --out /tmp/spool --delay 0.8
+    BADGEMATIC_PRINTER=tcp://127.0.0.1:9100 uvicorn app.main:app
+
+Accepts PJL-framed jobs over kept-alive connections (see
+app.printers.SocketPrinter) as well as one bare job per connection, and
+holds each connection for `delay` seconds per job like a print engine, so
+the sender sees realistic backpressure.
+"""
+import argparse
+import asyncio
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Set
+
+from app.printers import UEL
+from app.utils import atomic_write_bytes
+
+_FRAMED_JOB = re.compile(
+    re.escape(UEL) + rb'@PJL JOB NAME="([^"]*)"\r\n(.*?)'
+    + re.escape(UEL) + rb'@PJL EOJ NAME="\1"\r\n' + re.escape(UEL),
+    re.DOTALL,
+)
+
+
+@dataclass
+class SpooledJob:
+    name: str
+    size: int
+    connection: int
+    received_at: float
+
+
+class FakeSpooler:
+    """Async TCP server that records (and optionally saves) every job it gets."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        outdir: Optional[Path] = None,
+        delay: float = 0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.outdir = Path(outdir) if outdir else None
+        self.delay = delay
+        self.jobs: List[SpooledJob] = []
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+
+    async def start(self) -> "FakeSpooler":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _save(self, name: str, data: bytes) -> None:
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(self.outdir / name, data)
+
+    async def _accept(self, name: str, data: bytes, connection: int) -> None:
+        self.jobs.append(SpooledJob(name, len(data), connection, time.time()))
+        if self.outdir is not None:
+            await asyncio.to_thread(self._save, name, data)
+        if self.delay:
+            await asyncio.sleep(self.delay)  # "printing": stop reading meanwhile
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+        self.connections += 1
+        connection = self.connections
+        buf = b""
+        try:
+            while True:
+                chunk = await reader.read(64 * 1024)
+                if not chunk:
+                    break
+                buf += chunk
+                while True:
+                    match = _FRAMED_JOB.search(buf)
+                    if match is None:
+                        break
+                    buf = buf[match.end():]
+                    name = match.group(1).decode("ascii", "replace")
+                    await self._accept(name, match.group(2), connection)
+            if buf.strip(UEL):
+                # unframed sender: the whole connection was one job
+                await self._accept(f"job-{len(self.jobs) + 1}", buf, connection)
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # sender went away, or the spooler is shutting down
+        finally:
+            writer.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.spooler", description="Fake raw port 9100 printer."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--out", type=Path, help="save received jobs here")
+    parser.add_argument(
+        "--delay", type=float, default=0.8, help="seconds spent printing each job"
+    )
+    args = parser.parse_args(argv)
+
+    spooler = FakeSpooler(args.host, args.port, args.out, args.delay)
+    print(f"spooler listening on {args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(spooler.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
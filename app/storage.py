@@ -0,0 +1,74 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Generic, List, Optional, Tuple, TypeVar
+
+# Building blocks shared by the job store, the session store and the queue.
+
+V = TypeVar("V")
+
+
+class SQLiteConnections:
+    """
+    Per-thread connections to one SQLite file in WAL mode (sqlite3
+    connections are not shareable across threads). Autocommit: callers open
+    their own transactions with BEGIN IMMEDIATE where they need one.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class ExpiringLRU(Generic[V]):
+    """
+    Bounded map whose entries expire ttl seconds after their last put().
+    Not locked: callers serialize access (and their read-modify-writes).
+    """
+
+    def __init__(self, max_items: int, ttl: float):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, V]]" = OrderedDict()
+
+    def _evict(self, now: float) -> None:
+        while self._items:
+            key, (touched, _) = next(iter(self._items.items()))
+            if len(self._items) <= self.max_items and now - touched <= self.ttl:
+                break
+            self._items.pop(key)
+
+    def get(self, key: str) -> Optional[V]:
+        self._evict(time.time())
+        entry = self._items.get(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, key: str, value: V) -> None:
+        now = time.time()
+        self._items[key] = (now, value)
+        self._items.move_to_end(key)
+        self._evict(now)
+
+    def pop(self, key: str) -> Optional[V]:
+        entry = self._items.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def values(self) -> List[V]:
+        self._evict(time.time())
+        return [value for _, value in self._items.values()]
+
+    def __len__(self) -> int:
+        self._evict(time.time())
+        return len(self._items)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+log = logging.getLogger(__name__)
+
+TMP_TTL = 15 * 60  # leftovers of interrupted atomic writes
+
+
+@dataclass
+class SweepTarget:
+    """A directory whose files expire after ttl seconds, capped at max_bytes."""
+
+    directory: Path
+    ttl: float
+    max_bytes: int
+    exclude: Tuple[str, ...] = ()  # top-level subdirectories managed elsewhere
+    min_age: float = 0  # younger files are kept even over quota
+
+
+@dataclass
+class SweepStats:
+    deleted: int = 0
+    freed_bytes: int = 0
+    usage: Dict[str, int] = field(default_factory=dict)  # directory -> bytes kept
+
+
+class Sweeper:
+    """
+    Deletes expired or over-quota files that are no longer referenced.
+    `referenced()` returns the resolved paths (files or directories) still
+    in use by live jobs; those are never deleted. Files younger than their
+    target's min_age (e.g. uploads of sessions with no job yet) survive
+    quota pressure too.
+    """
+
+    def __init__(
+        self,
+        targets: Iterable[SweepTarget],
+        referenced: Callable[[], Set[Path]],
+        interval: float = 300,
+    ):
+        self.targets: List[SweepTarget] = list(targets)
+        self.referenced = referenced
+        self.interval = interval
+
+    def _scan(self, target: SweepTarget) -> List[Tuple[float, int, Path]]:
+        files = []
+        for root, dirs, names in os.walk(target.directory):
+            if Path(root) == target.directory:
+                dirs[:] = [d for d in dirs if d not in target.exclude]
+            for name in names:
+                path = Path(root) / name
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        files.sort()  # oldest first
+        return files
+
+    def sweep(self) -> SweepStats:
+        """One pass over all targets. Blocking; run off the event loop."""
+        stats = SweepStats()
+        refs = self.referenced()
+        now = time.time()
+        for target in self.targets:
+            if not target.directory.is_dir():
+                continue
+            files = self._scan(target)
+            total = sum(size for _, size, _ in files)
+            for mtime, size, path in files:
+                resolved = path.resolve()
+                if resolved in refs or resolved.parent in refs:
+                    continue
+                ttl = TMP_TTL if path.name.endswith(".tmp") else target.ttl
+                if now - mtime <= ttl and (
+                    total <= target.max_bytes or now - mtime < target.min_age
+                ):
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    log.warning("sweeper: cannot delete %s: %s", path, e)
+                    continue
+                total -= size
+                stats.deleted += 1
+                stats.freed_bytes += size
+            self._prune_empty_dirs(target)
+            stats.usage[str(target.directory)] = total
+        return stats
+
+    def _prune_empty_dirs(self, target: SweepTarget) -> None:
+        for root, _, _ in os.walk(target.directory, topdown=False):
+            path = Path(root)
+            if path == target.directory:
+                continue
+            if path.relative_to(target.directory).parts[0] in target.exclude:
+                continue
+            try:
+                path.rmdir()  # only succeeds when empty
+            except OSError:
+                pass
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                stats = await run_in_threadpool(self.sweep)
+                if stats.deleted:
+                    log.info(
+                        "sweeper: deleted %d files (%d bytes)",
+                        stats.deleted,
+                        stats.freed_bytes,
+                    )
+            except Exception:
+                log.exception("sweeper pass failed")
+            await asyncio.sleep(self.interval)
@@ -1,58 +1,272 @@
 import base64
+import math
+import os
+import re
+import threading
+import uuid
+from dataclasses import dataclass
 from io import BytesIO
 from pathlib import Path
-from typing import Dict, Optional
+from typing import BinaryIO, Dict, Optional, Tuple, Union
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, features
 import qrcode
 
+BADGE_SIZE = (860, 540)  # ~CR80 aspect @ ~150dpi, adjust as you wish
+FONT_FILE = "arial.ttf"
+FONT_SIZES = {"big": 42, "med": 28, "small": 24}
+PHOTO_SIZE = (300, 375)  # 4:5 portrait slot on the badge
+THUMB_SIZE = (120, 150)  # /review preview
+THUMB_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMB_EXT = ".webp" if THUMB_FORMAT == "WEBP" else ".jpg"
+DEFAULT_TEMPLATE_PATH = "app/static/img/badge_template.png"
+# Bump whenever the composition below changes, so cached renders are invalidated
+RENDER_REVISION = 2
 
-def _decode_photo(photo_data_b64: str) -> Image.Image:
-    # photo_data_b64: "data:image/jpeg;base64,...."
-    _, b64 = photo_data_b64.split(",", 1)
-    raw = base64.b64decode(b64)
-    img = Image.open(BytesIO(raw)).convert("RGB")
-    return img
 
+# Output encodings: name -> (Pillow format, file extension)
+BADGE_FORMATS = {"png": ("PNG", ".png"), "bmp": ("BMP", ".bmp"), "ppm": ("PPM", ".ppm")}
 
-def generate_badge_png(
-    formdata: Dict[str, str],
-    photo_data_b64: str,
-    outdir: str = "app/badge_outputs",
-    template_path: Optional[str] = "app/static/img/badge_template.png",
-) -> str:
+
+@dataclass(frozen=True)
+class BadgeEncoding:
     """
-    Returns absolute path to generated badge PNG.
+    How a composed badge is serialized. PNG compress_level trades CPU for
+    size (0 = store only, 9 = smallest); BMP/PPM are uncompressed and the
+    cheapest to produce for a local printer handoff.
     """
-    out_dir = Path(outdir)
-    out_dir.mkdir(parents=True, exist_ok=True)
 
-    # Canvas
-    W, H = 860, 540  # ~CR80 aspect @ ~150dpi, adjust as you wish
-    base = Image.new("RGBA", (W, H), "#F9F9F9")  # White base
+    format: str = "png"
+    compress_level: int = 6
+    optimize: bool = False
 
-    # Optional template overlay
-    if template_path and Path(template_path).is_file():
-        tpl = Image.open(template_path).convert("RGBA").resize((W, H))
-        base.alpha_composite(tpl)
+    def __post_init__(self):
+        if self.format not in BADGE_FORMATS:
+            raise ValueError(f"Unknown badge format: {self.format!r}")
+        if not 0 <= self.compress_level <= 9:
+            raise ValueError(f"PNG compress_level out of range: {self.compress_level}")
 
-    # Photo
-    photo = _decode_photo(photo_data_b64)
-    # Crop center to 4:5 then resize
-    pw, ph = photo.size
-    target_ratio = 4 / 5
-    cur_ratio = pw / ph
-    if cur_ratio > target_ratio:
+    @classmethod
+    def parse(cls, spec: str) -> "BadgeEncoding":
+        """'png', 'png:1', 'png:9:optimize', 'bmp' or 'ppm'."""
+        fmt, *opts = spec.strip().lower().split(":")
+        if opts and fmt != "png":
+            raise ValueError(f"{fmt} takes no options: {spec!r}")
+        levels = [o for o in opts if o.isdigit()]
+        unknown = [o for o in opts if o not in levels and o != "optimize"]
+        if unknown or len(levels) > 1 or opts.count("optimize") > 1:
+            raise ValueError(f"Bad badge encoding: {spec!r}")
+        return cls(fmt, int(levels[0]) if levels else 6, "optimize" in opts)
+
+    @property
+    def spec(self) -> str:
+        if self.format != "png":
+            return self.format
+        return f"png:{self.compress_level}" + (":optimize" if self.optimize else "")
+
+    @property
+    def ext(self) -> str:
+        return BADGE_FORMATS[self.format][1]
+
+    @property
+    def pil_format(self) -> str:
+        return BADGE_FORMATS[self.format][0]
+
+    def params(self) -> Dict:
+        if self.format == "png":
+            return {"compress_level": self.compress_level, "optimize": self.optimize}
+        return {}
+
+
+PNG_DEFAULT = BadgeEncoding()
+
+
+class RenderResources:
+    """
+    Process-wide cache for the pre-resized badge template and the fonts.
+    The template is reloaded only when its file mtime changes.
+    """
+
+    def __init__(self, size: Tuple[int, int] = BADGE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # template path -> (mtime_ns or None if missing, resized RGBA image or None)
+        self._templates: Dict[str, Tuple[Optional[int], Optional[Image.Image]]] = {}
+        self._fonts: Optional[Dict[str, ImageFont.ImageFont]] = None
+
+    def template(self, template_path: Optional[str]) -> Optional[Image.Image]:
+        if not template_path:
+            return None
+        try:
+            mtime = os.stat(template_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            cached = self._templates.get(template_path)
+            if cached is not None and cached[0] == mtime:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            tpl = None
+            if mtime is not None:
+                tpl = Image.open(template_path).convert("RGBA").resize(self.size)
+            self._templates[template_path] = (mtime, tpl)
+            return tpl
+
+    def fonts(self) -> Dict[str, ImageFont.ImageFont]:
+        with self._lock:
+            if self._fonts is not None:
+                self.hits += 1
+                return self._fonts
+            self.misses += 1
+            try:
+                fonts = {
+                    key: ImageFont.truetype(FONT_FILE, size)
+                    for key, size in FONT_SIZES.items()
+                }
+            except Exception:
+                default = ImageFont.load_default()
+                fonts = {key: default for key in FONT_SIZES}
+            self._fonts = fonts
+            return fonts
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "templates": len(self._templates),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+            self._fonts = None
+
+
+RENDER_RESOURCES = RenderResources()
+
+
+def layout_fingerprint(template_path: Optional[str] = DEFAULT_TEMPLATE_PATH) -> str:
+    """
+    Everything besides formdata and the photo that affects the rendered
+    badge: layout constants, code revision and the template file version.
+    """
+    try:
+        template_version = os.stat(template_path).st_mtime_ns if template_path else None
+    except OSError:
+        template_version = None
+    return repr(
+        (
+            RENDER_REVISION,
+            BADGE_SIZE,
+            PHOTO_SIZE,
+            FONT_FILE,
+            sorted(FONT_SIZES.items()),
+            template_path,
+            template_version,
+        )
+    )
+
+
+# A ready PIL image, raw bytes, a binary file object, a filesystem path,
+# or (legacy) a "data:image/...;base64,..." URL.
+PhotoSource = Union[Image.Image, bytes, BinaryIO, str, os.PathLike]
+
+
+def _crop_box(
+    size: Tuple[int, int], target: Tuple[int, int]
+) -> Tuple[int, int, int, int]:
+    """Center crop of `size` to the aspect ratio of `target`."""
+    pw, ph = size
+    target_ratio = target[0] / target[1]
+    if pw / ph > target_ratio:
         new_w = int(ph * target_ratio)
         x0 = (pw - new_w) // 2
-        photo = photo.crop((x0, 0, x0 + new_w, ph))
+        return (x0, 0, x0 + new_w, ph)
+    new_h = int(pw / target_ratio)
+    y0 = (ph - new_h) // 2
+    return (0, y0, pw, y0 + new_h)
+
+
+def _draft_for(img: Image.Image, target: Tuple[int, int]) -> None:
+    """
+    Lets the JPEG decoder downscale in the DCT domain (1/2, 1/4, 1/8) as far
+    as possible while the center crop still covers `target` at full detail.
+    No-op for other formats or already-loaded images.
+    """
+    if img.format != "JPEG":
+        return
+    x0, y0, x1, y1 = _crop_box(img.size, target)
+    scale = max(target[0] / (x1 - x0), target[1] / (y1 - y0))
+    if scale < 1:
+        img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+
+
+def _decode_photo(
+    photo: PhotoSource, target: Tuple[int, int] = PHOTO_SIZE
+) -> Image.Image:
+    if isinstance(photo, Image.Image):
+        return photo.convert("RGB")
+    elif isinstance(photo, (bytes, bytearray, memoryview)):
+        img = Image.open(BytesIO(photo))
+    elif isinstance(photo, str) and photo.startswith("data:"):
+        _, b64 = photo.split(",", 1)
+        img = Image.open(BytesIO(base64.b64decode(b64)))
     else:
-        new_h = int(pw / target_ratio)
-        y0 = (ph - new_h) // 2
-        photo = photo.crop((0, y0, pw, y0 + new_h))
-    photo = photo.resize((300, 375))
-    base.alpha_composite(photo.convert("RGBA"), dest=(40, 80))
+        # path or file-like object: Pillow reads it directly, no extra copy
+        img = Image.open(photo)
+    _draft_for(img, target)
+    return img.convert("RGB")
+
 
+def _fit_photo(img: Image.Image, target: Tuple[int, int] = PHOTO_SIZE) -> Image.Image:
+    """Center crop to the target aspect ratio, then resize to target."""
+    # reducing_gap: cheap integer reduce() first, then a short resampling pass
+    return img.resize(target, box=_crop_box(img.size, target), reducing_gap=3.0)
+
+
+def normalize_photo(photo: PhotoSource, print_path: Path, thumb_path: Path) -> None:
+    """
+    Upload-time derivatives of a captured photo: the exact 4:5 PHOTO_SIZE
+    crop used for printing (JPEG) and a small THUMB_SIZE preview.
+    """
+    fitted = _fit_photo(_decode_photo(photo))
+    _atomic_save(fitted, print_path, "JPEG", quality=95)
+    thumb = _fit_photo(fitted, THUMB_SIZE)
+    _atomic_save(thumb, thumb_path, THUMB_FORMAT, quality=80)
+
+
+def _atomic_tmp(out_path: Path) -> Path:
+    # Hidden, unique and ".tmp": the sweeper reaps leftovers of crashed writes
+    return out_path.with_name(f".{out_path.name}.{uuid.uuid4().hex}.tmp")
+
+
+def _atomic_save(img: Image.Image, out_path: Path, fmt: str, **params) -> None:
+    # Write next to the target then rename: readers never see a partial file
+    tmp = _atomic_tmp(out_path)
+    try:
+        img.save(tmp, fmt, **params)
+        os.replace(tmp, out_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Writes data to a temp file next to path, then renames it into place."""
+    tmp = _atomic_tmp(path)
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _make_qr(formdata: Dict[str, str]) -> Image.Image:
     # QR (VCARD)
     vcard = (
         "BEGIN:VCARD\n"
@@ -64,19 +278,13 @@ def generate_badge_png(
         f"TITLE:{formdata.get('title','')}\n"
         "END:VCARD"
     )
-    qr_img = qrcode.make(vcard).resize((140, 140)).convert("RGBA")
-    base.alpha_composite(qr_img, dest=(W - 40 - 140, H - 40 - 140))
+    return qrcode.make(vcard).resize((140, 140)).convert("RGBA")
 
-    # Text
+
+def _draw_text(base: Image.Image, formdata: Dict[str, str]) -> None:
     draw = ImageDraw.Draw(base)
-    try:
-        font_big = ImageFont.truetype("arial.ttf", 42)
-        font_med = ImageFont.truetype("arial.ttf", 28)
-        font_small = ImageFont.truetype("arial.ttf", 24)
-    except Exception:
-        font_big = ImageFont.load_default()
-        font_med = ImageFont.load_default()
-        font_small = ImageFont.load_default()
+    fonts = RENDER_RESOURCES.fonts()
+    font_big, font_med, font_small = fonts["big"], fonts["med"], fonts["small"]
 
     name = formdata.get("name", "")
     title = formdata.get("title", "")
@@ -86,8 +294,71 @@ def generate_badge_png(
     draw.text((370, 180), title, fill="#020F13", font=font_med)  # Black
     draw.text((370, 220), f"#{emp}", fill="#020F13", font=font_small)
 
+
+def compose_badge(
+    formdata: Dict[str, str],
+    photo: PhotoSource,
+    template_path: Optional[str] = DEFAULT_TEMPLATE_PATH,
+) -> Image.Image:
+    """Builds the badge image (RGB) without encoding or saving it."""
+    # Canvas
+    W, H = BADGE_SIZE
+    base = Image.new("RGBA", (W, H), "#F9F9F9")  # White base
+
+    # Optional template overlay (decoded + resized once, see RenderResources)
+    tpl = RENDER_RESOURCES.template(template_path)
+    if tpl is not None:
+        base.alpha_composite(tpl)
+
+    # Photo
+    # Decode only the resolution needed, then crop center to 4:5 and resize
+    photo = _fit_photo(_decode_photo(photo))
+    base.alpha_composite(photo.convert("RGBA"), dest=(40, 80))
+
+    # QR
+    base.alpha_composite(_make_qr(formdata), dest=(W - 40 - 140, H - 40 - 140))
+
+    # Text
+    _draw_text(base, formdata)
+    return base.convert("RGB")
+
+
+def render_badge(
+    formdata: Dict[str, str],
+    photo: PhotoSource,
+    encoding: BadgeEncoding = PNG_DEFAULT,
+    template_path: Optional[str] = DEFAULT_TEMPLATE_PATH,
+) -> bytes:
+    """Returns the encoded badge as bytes; nothing is written to disk."""
+    buf = BytesIO()
+    compose_badge(formdata, photo, template_path).save(
+        buf, encoding.pil_format, **encoding.params()
+    )
+    return buf.getvalue()
+
+
+def generate_badge_png(
+    formdata: Dict[str, str],
+    photo: PhotoSource,
+    outdir: str = "app/badge_outputs",
+    template_path: Optional[str] = DEFAULT_TEMPLATE_PATH,
+    out_name: Optional[str] = None,
+    encoding: BadgeEncoding = PNG_DEFAULT,
+) -> str:
+    """
+    Returns absolute path to generated badge file (PNG unless `encoding`
+    says otherwise). out_name (e.g. the job id) names the file; by default
+    a unique name is derived from the employee number so concurrent renders
+    never share a path.
+    """
+    out_dir = Path(outdir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    badge = compose_badge(formdata, photo, template_path)
+
     # Save
-    fname = f"{emp or 'badge'}_badge.png"
-    out_path = out_dir / fname
-    base.convert("RGB").save(out_path, "PNG")
-    return str(out_path.resolve())
\ No newline at end of file
+    emp = formdata.get("employee_number", "")
+    safe_emp = re.sub(r"[^\w-]", "_", emp)  # never let formdata pick the path
+    fname = out_name or f"{safe_emp or 'badge'}_{uuid.uuid4().hex[:12]}"
+    out_path = out_dir / f"{fname}_badge{encoding.ext}"
+    _atomic_save(badge, out_path, encoding.pil_format, **encoding.params())
+    return str(out_path.resolve())
@@ -0,0 +1,168 @@
+"""
+Out-of-process badge renderers, fed by the durable job queue:
+
+    BADGEMATIC_RENDER_BACKEND=worker BADGEMATIC_JOB_STORE=sqlite \\
+        uvicorn app.main:app --workers 2
+    BADGEMATIC_JOB_STORE=sqlite python -m app.worker --processes 4
+
+The web tier enqueues "render" tasks in the queue database; each worker
+process claims one under a lease, renders it with generate_badge_png into
+the task's outdir and marks it done (or failed). Progress is written to the
+shared job store so /status shows which worker has the job. No broker:
+workers poll the SQLite queue, which costs a cheap indexed read per poll.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from app.job_queue import DurableQueue, worker_id
+from app.jobs import JobStore, make_job_store
+from app.render_pool import warm_render_worker
+from app.utils import BadgeEncoding, generate_badge_png
+
+log = logging.getLogger(__name__)
+
+# Same environment (and defaults) as app.main, without importing the web app
+BASE_DIR = Path(__file__).resolve().parent
+QUEUE_DB_PATH = Path(
+    os.getenv("BADGEMATIC_QUEUE_DB", BASE_DIR / "data" / "queue.sqlite3")
+)
+JOB_STORE_BACKEND = os.getenv("BADGEMATIC_JOB_STORE", "memory")
+JOB_DB_PATH = Path(os.getenv("BADGEMATIC_JOB_DB", BASE_DIR / "data" / "jobs.sqlite3"))
+JOB_TTL = int(os.getenv("BADGEMATIC_JOB_TTL", 60 * 60))
+JOB_LEASE = float(os.getenv("BADGEMATIC_JOB_LEASE", 30))
+
+LOG_FORMAT = "%(asctime)s %(processName)s %(levelname)s %(message)s"
+
+
+@contextmanager
+def heartbeat(
+    queue: DurableQueue, task_id: str, owner: str, lease: float
+) -> Iterator[None]:
+    """Keeps the task's lease alive from a thread while the render runs."""
+    stop = threading.Event()
+
+    def beat() -> None:
+        while not stop.wait(lease / 3):
+            queue.heartbeat(task_id, owner, lease)
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def render_task(task: dict) -> str:
+    payload = task["payload"]
+    return generate_badge_png(
+        payload["formdata"],
+        payload["photo_path"],
+        outdir=payload["outdir"],
+        out_name=payload["out_name"],
+        encoding=BadgeEncoding.parse(payload["encoding"]),
+    )
+
+
+def run_once(
+    queue: DurableQueue, jobs: Optional[JobStore], owner: str, lease: float
+) -> bool:
+    """Claims and renders one task; False if the queue had none."""
+    task = queue.claim(owner, lease, kind="render")
+    if task is None:
+        return False
+    job_id = task["payload"]["job_id"]
+    if jobs is not None:
+        jobs.update(job_id, render_worker=owner)
+    try:
+        with heartbeat(queue, task["job_id"], owner, lease):
+            out_path = render_task(task)
+    except Exception as e:
+        log.exception("render of %s failed", job_id)
+        queue.fail(task["job_id"], owner, str(e) or type(e).__name__)
+    else:
+        abandoned = not queue.complete(task["job_id"], owner) and (
+            queue.state(task["job_id"]) or ("failed",)
+        )[0] == "failed"
+        if abandoned:  # the web tier gave up waiting: nobody will read it
+            log.info("render of %s abandoned, dropping %s", job_id, out_path)
+            Path(out_path).unlink(missing_ok=True)
+    return True
+
+
+def work_forever(queue_path: str, poll: float, lease: float) -> None:
+    """One worker process: claim, render, repeat."""
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    queue = DurableQueue(Path(queue_path))
+    # memory job stores live inside the web process: nothing to report to
+    jobs = (
+        make_job_store("sqlite", JOB_DB_PATH, JOB_TTL, 0)
+        if JOB_STORE_BACKEND == "sqlite"
+        else None
+    )
+    owner = worker_id()
+    parent = os.getppid()
+    warm_render_worker()
+    log.info("render worker %s polling %s", owner, queue_path)
+    while os.getppid() == parent:  # exit with the supervisor, even if killed
+        try:
+            busy = run_once(queue, jobs, owner, lease)
+        except Exception:
+            log.exception("render worker loop failed")
+            busy = False
+        if not busy:
+            time.sleep(poll)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.worker", description="Render badges queued by the web tier."
+    )
+    parser.add_argument(
+        "--processes", type=int, default=os.cpu_count() or 1, help="render processes"
+    )
+    parser.add_argument("--queue", default=str(QUEUE_DB_PATH), help="queue database")
+    parser.add_argument(
+        "--poll", type=float, default=0.05, help="idle seconds between queue polls"
+    )
+    parser.add_argument("--lease", type=float, default=JOB_LEASE, help="lease seconds")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+    # SIGTERM (docker stop, systemd) unwinds through the finally below
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(
+            target=work_forever,
+            args=(args.queue, args.poll, args.lease),
+            name=f"render-{i}",
+            daemon=True,
+        )
+        for i in range(args.processes)
+    ]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            proc.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Render benchmark for app.utils.generate_badge_png.
+
+    python -m benchmarks.bench_render [--repeat 20] [--sizes vga,1080p,4k]
+                                      [--encoding png:6] [--json]
+
+Renders badges from synthetic JPEG photos at several webcam resolutions and
+with short/long formdata, and reports the median time of each stage
+(decode, crop/resize, QR, text, encode), the full render, and the peak
+memory of a render. Each case runs in a fresh process so peak RSS and the
+template/font cache state are comparable between cases.
+"""
+import argparse
+import json
+import multiprocessing
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+SIZES = {
+    "vga": (640, 480),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+FORMDATA = {
+    "short": {
+        "name": "Ana Li",
+        "employee_number": "42",
+        "title": "Dev",
+        "phone": "555-0100",
+        "email": "ana@example.com",
+    },
+    "long": {
+        "name": "Maximilienne-Éléonore de la Fontaine-Beauregard",
+        "employee_number": "2024-000123456",
+        "title": "Directrice principale, infrastructures et opérations",
+        "phone": "+1 (555) 010-0199 poste 12345",
+        "email": "maximilienne.delafontaine-beauregard@example-entreprise.com",
+    },
+}
+
+
+def synthetic_photo(size) -> bytes:
+    """Noisy frame (realistic JPEG entropy) encoded like a browser capture."""
+    buf = BytesIO()
+    img = Image.merge("RGB", [Image.effect_noise(size, 60) for _ in range(3)])
+    img.save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+
+def _median_ms(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _peak_rss_kb() -> int:
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(
+    size_name: str, form_name: str, repeat: int, encoding_spec: str = "png:6"
+) -> Dict[str, float]:
+    from app import utils
+
+    encoding = utils.BadgeEncoding.parse(encoding_spec)
+    photo = synthetic_photo(SIZES[size_name])
+    formdata = FORMDATA[form_name]
+    outdir = tempfile.mkdtemp(prefix="badgematic-bench-")
+
+    # warm the template/font cache once, like a long-running worker
+    utils.generate_badge_png(formdata, photo, outdir=outdir, encoding=encoding)
+
+    decoded = utils._decode_photo(photo)
+    badge = utils.compose_badge(formdata, photo)
+    canvas = Image.new("RGBA", utils.BADGE_SIZE, "#F9F9F9")
+
+    def encode():
+        badge.save(BytesIO(), encoding.pil_format, **encoding.params())
+
+    result = {
+        "decode_ms": _median_ms(lambda: utils._decode_photo(photo), repeat),
+        "crop_resize_ms": _median_ms(lambda: utils._fit_photo(decoded), repeat),
+        "qr_ms": _median_ms(lambda: utils._make_qr(formdata), repeat),
+        "text_ms": _median_ms(
+            lambda: utils._draw_text(canvas.copy(), formdata), repeat
+        ),
+        "encode_ms": _median_ms(encode, repeat),
+        "total_ms": _median_ms(
+            lambda: utils.generate_badge_png(
+                formdata, photo, outdir=outdir, encoding=encoding
+            ),
+            repeat,
+        ),
+    }
+
+    # peak memory of one render: Python heap (tracemalloc) and process RSS
+    rss_before = _peak_rss_kb()
+    tracemalloc.start()
+    utils.generate_badge_png(formdata, photo, outdir=outdir, encoding=encoding)
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["py_peak_kb"] = py_peak // 1024
+    result["rss_peak_kb"] = _peak_rss_kb()
+    result["rss_growth_kb"] = result["rss_peak_kb"] - rss_before
+    shutil.rmtree(outdir, ignore_errors=True)
+    return result
+
+
+def _run_isolated(args) -> Dict[str, float]:
+    return run_case(*args)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_render")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per stage")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma separated")
+    parser.add_argument("--forms", default=",".join(FORMDATA), help="comma separated")
+    parser.add_argument("--encoding", default="png:6", help="e.g. png:1, bmp, ppm")
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args(argv)
+
+    cases = [
+        (size, form, args.repeat, args.encoding)
+        for size in args.sizes.split(",")
+        for form in args.forms.split(",")
+    ]
+    ctx = multiprocessing.get_context("spawn")
+    columns = (
+        "decode_ms", "crop_resize_ms", "qr_ms", "text_ms", "encode_ms", "total_ms"
+    )
+    if not args.json:
+        header = "".join(f"{c[:-3]:>12}" for c in columns)
+        print(f"{'case':<14}{header}{'peak RSS MB':>13}")
+    for case in cases:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(_run_isolated, (case,))
+        label = f"{case[0]}/{case[1]}"
+        if args.json:
+            print(json.dumps({"case": label, **result}))
+        else:
+            print(
+                f"{label:<14}"
+                + "".join(f"{result[c]:>12.2f}" for c in columns)
+                + f"{result['rss_peak_kb'] / 1024:>13.1f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Load generator that walks N concurrent kiosks through the full flow:
+
+    /form -> /photo -> /review -> /print -> /confirm -> /status polling -> /feedback
+
+against a running server (e.g. `uvicorn app.main:app --workers 4`):
+
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --kiosks 20 --duration 60
+
+Reports completed flows/s, p50/p95/p99 latency per route and
+time-to-printed-badge (POST /print until /status shows success).
+Needs httpx (requirements-dev.txt).
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections import defaultdict
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from PIL import Image
+
+FORM = {
+    "name": "Charge Test",
+    "employee_number": "0",
+    "title": "Kiosk",
+    "phone": "555-0100",
+    "email": "load@example.com",
+}
+
+
+class Stats:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.time_to_badge: List[float] = []
+        self.flows_ok = 0
+        self.flows_failed = 0
+
+
+def synthetic_photo(size: Tuple[int, int]) -> bytes:
+    buf = BytesIO()
+    Image.merge("RGB", [Image.effect_noise(size, 60) for _ in range(3)]).save(
+        buf, "JPEG", quality=92
+    )
+    return buf.getvalue()
+
+
+async def _call(
+    client: httpx.AsyncClient, stats: Stats, method: str, route: str, **kwargs
+) -> httpx.Response:
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, route, **kwargs)
+    except httpx.HTTPError:
+        stats.errors[f"{method} {route}"] += 1
+        raise
+    stats.latency[f"{method} {route}"].append(time.perf_counter() - start)
+    if response.status_code >= 400:
+        stats.errors[f"{method} {route}"] += 1
+        response.raise_for_status()
+    return response
+
+
+async def kiosk_flow(
+    client: httpx.AsyncClient,
+    stats: Stats,
+    kiosk: int,
+    iteration: int,
+    photo: bytes,
+    poll_interval: float,
+    job_timeout: float,
+) -> None:
+    # unique formdata per flow so the render cache does not hide render cost
+    form = {**FORM, "employee_number": f"{kiosk}-{iteration}"}
+    await _call(client, stats, "GET", "/form")
+    await _call(client, stats, "POST", "/form", data=form)
+    await _call(client, stats, "GET", "/photo")
+    await _call(
+        client, stats, "POST", "/photo",
+        files={"photo": ("photo.jpg", photo, "image/jpeg")},
+    )
+    await _call(client, stats, "GET", "/review")
+
+    printed_at = time.perf_counter()
+    await _call(client, stats, "POST", "/print")
+    await _call(client, stats, "GET", "/confirm")
+
+    # poll like htmx does (700ms), revalidating with the ETag
+    etag: Optional[str] = None
+    while True:
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await _call(client, stats, "GET", "/status", headers=headers)
+        etag = response.headers.get("etag", etag)
+        if response.status_code == 200:
+            if "alert-success" in response.text:
+                stats.time_to_badge.append(time.perf_counter() - printed_at)
+                break
+            if "alert-error" in response.text:
+                raise RuntimeError("print job failed")
+        if time.perf_counter() - printed_at > job_timeout:
+            raise TimeoutError("job did not finish")
+        await asyncio.sleep(poll_interval)
+
+    await _call(client, stats, "POST", "/feedback", data={"rating": 5, "comments": ""})
+
+
+async def kiosk_loop(url: str, kiosk: int, stats: Stats, deadline: float, args) -> None:
+    photo = args.photo_bytes
+    iteration = 0
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout) as client:
+        while time.perf_counter() < deadline:
+            iteration += 1
+            try:
+                await kiosk_flow(
+                    client, stats, kiosk, iteration, photo,
+                    args.poll_interval, args.timeout,
+                )
+                stats.flows_ok += 1
+            except Exception:
+                stats.flows_failed += 1
+            client.cookies.clear()
+
+
+def _pct(samples: List[float], q: float) -> float:
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+def report(stats: Stats, elapsed: float) -> None:
+    print(
+        f"flows: {stats.flows_ok} ok, {stats.flows_failed} failed in {elapsed:.1f}s "
+        f"-> {stats.flows_ok / elapsed:.2f} badges/s"
+    )
+    print(
+        f"{'route':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'errors':>8}"
+    )
+    rows = sorted(stats.latency.items()) + [("time-to-badge", stats.time_to_badge)]
+    for route, samples in rows:
+        if not samples:
+            continue
+        p50, p95, p99 = (_pct(samples, q) * 1000 for q in (50, 95, 99))
+        print(
+            f"{route:<16}{len(samples):>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}"
+            f"{stats.errors.get(route, 0):>8}"
+        )
+
+
+async def run(args) -> Stats:
+    stats = Stats()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *(kiosk_loop(args.url, k, stats, deadline, args) for k in range(args.kiosks))
+    )
+    report(stats, time.perf_counter() - start)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--kiosks", type=int, default=10, help="concurrent kiosks")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.7)
+    parser.add_argument("--photo-size", default="1920x1080", help="WxH")
+    parser.add_argument("--timeout", type=float, default=60, help="per request/job")
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.photo_size.lower().split("x"))
+    args.photo_bytes = synthetic_photo((width, height))
+    stats = asyncio.run(run(args))
+    return 0 if stats.flows_ok and not stats.flows_failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+from app.job_queue import DurableQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return DurableQueue(tmp_path / "queue.sqlite3")
+
+
+def test_claim_leases_oldest_pending_task(queue):
+    queue.enqueue("a", "print", {"n": 1})
+    queue.enqueue("b", "print", {"n": 2})
+
+    task = queue.claim("w1", lease=30)
+    assert task["job_id"] == "a"
+    assert task["payload"] == {"n": 1}
+    assert task["attempts"] == 1
+    assert queue.state("a") == ("leased", None)
+    assert queue.claim("w2", lease=30)["job_id"] == "b"
+    assert queue.claim("w3", lease=30) is None
+
+
+def test_claim_filters_by_kind(queue):
+    queue.enqueue("render:1", "render", {})
+    assert queue.claim("w", lease=30, kind="print") is None
+    assert queue.claim("w", lease=30, kind="render")["job_id"] == "render:1"
+
+
+def test_expired_lease_is_handed_out_again(queue):
+    queue.enqueue("a", "print", {})
+    queue.claim("w1", lease=0.05)
+    assert queue.claim("w2", lease=30) is None  # still leased to w1
+
+    time.sleep(0.1)
+    task = queue.claim("w2", lease=30)
+    assert task["job_id"] == "a"
+    assert task["attempts"] == 2
+    # the previous owner lost it
+    assert not queue.heartbeat("a", "w1", 30)
+    assert not queue.complete("a", "w1")
+    assert queue.complete("a", "w2")
+    assert queue.state("a") == ("done", None)
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    queue.enqueue("a", "print", {})
+    queue.claim("w1", lease=0.2)
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat("a", "w1", 0.2)
+    assert queue.claim("w2", lease=30) is None
+
+
+def test_enqueue_with_owner_is_leased_right_away(queue):
+    queue.enqueue("a", "print", {}, owner="w1", lease=30)
+    assert queue.state("a") == ("leased", None)
+    assert queue.claim("w2", lease=30) is None
+    assert queue.heartbeat("a", "w1", 30)
+
+
+def test_mark_step_survives_a_resume(queue):
+    queue.enqueue("a", "print", {}, owner="w1", lease=0.05)
+    assert queue.mark_step("a", "w1", "printed")
+    assert queue.mark_step("a", "w1", "printed")  # idempotent
+    assert not queue.mark_step("a", "w2", "printed")  # not the owner
+
+    time.sleep(0.1)
+    task = queue.claim("w2", lease=30)
+    assert task["steps"] == ["printed"]
+
+
+def test_fail_records_the_error(queue):
+    queue.enqueue("a", "print", {})
+    queue.claim("w1", lease=30)
+    assert queue.fail("a", "w1", "jammed")
+    assert queue.state("a") == ("failed", "jammed")
+    assert queue.claim("w2", lease=30) is None
+
+
+def test_dedup_key_reuses_recent_task(queue):
+    first = queue.enqueue("a", "print", {}, dedup_key="k", window=30)
+    again = queue.enqueue("b", "print", {}, dedup_key="k", window=30)
+    assert first == again == "a"
+    assert queue.state("b") is None
+    assert queue.enqueue("c", "print", {}, dedup_key="other", window=30) == "c"
+
+
+def test_dedup_window_expires(queue):
+    queue.enqueue("a", "print", {}, dedup_key="k", window=0.05)
+    time.sleep(0.1)
+    assert queue.enqueue("b", "print", {}, dedup_key="k", window=0.05) == "b"
+
+
+def test_dedup_ignores_failed_tasks(queue):
+    queue.enqueue("a", "print", {}, owner="w1", lease=30, dedup_key="k", window=30)
+    queue.fail("a", "w1", "jammed")
+    assert queue.enqueue("b", "print", {}, dedup_key="k", window=30) == "b"
+
+
+def test_cancel_withdraws_pending_task(queue):
+    queue.enqueue("a", "render", {})
+    assert queue.cancel("a", "timed out")
+    assert queue.state("a") == ("failed", "timed out")
+    assert queue.claim("w1", lease=30) is None
+
+
+def test_cancel_stops_a_running_task_from_completing(queue):
+    queue.enqueue("a", "render", {})
+    queue.claim("w1", lease=30)
+    assert queue.cancel("a", "timed out")
+    assert not queue.complete("a", "w1")
+    assert queue.state("a") == ("failed", "timed out")
+
+
+def test_cancel_leaves_finished_tasks_alone(queue):
+    queue.enqueue("a", "render", {})
+    queue.claim("w1", lease=30)
+    queue.complete("a", "w1")
+    assert not queue.cancel("a", "timed out")
+    assert queue.state("a") == ("done", None)
+
+
+def test_prune_drops_only_old_finished_tasks(tmp_path):
+    queue = DurableQueue(tmp_path / "queue.sqlite3", retention=0.05)
+    queue.enqueue("done", "print", {}, owner="w1", lease=30)
+    queue.complete("done", "w1")
+    queue.enqueue("pending", "print", {})
+    time.sleep(0.1)
+    assert queue.prune() == 1
+    assert queue.counts() == {"pending": 1}
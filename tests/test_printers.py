@@ -0,0 +1,210 @@
+import asyncio
+import socket
+
+import pytest
+
+from app.printers import (
+    FileSinkPrinter,
+    PrinterError,
+    PrinterPool,
+    SimulatedPrinter,
+    SocketPrinter,
+)
+from app.spooler import FakeSpooler
+
+
+def _closed_port() -> int:
+    """A local port nothing listens on (connections are refused)."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StalledPrinter:
+    """Accepts connections but never reads, like a jammed print engine."""
+
+    async def __aenter__(self) -> "StalledPrinter":
+        self._done = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def _handle(self, reader, writer) -> None:
+        await self._done.wait()
+        writer.close()
+
+    async def __aexit__(self, *exc) -> None:
+        self._done.set()
+        self._server.close()
+        await self._server.wait_closed()
+
+
+def test_socket_printer_reuses_one_connection():
+    async def main():
+        spooler = await FakeSpooler().start()
+        printer = SocketPrinter("127.0.0.1", spooler.port, timeout=2)
+        for i in range(3):
+            await printer.send(b"badge-%d" % i, f"job-{i}")
+        await printer.close()
+        await asyncio.sleep(0.05)
+        await spooler.close()
+        return spooler
+
+    spooler = asyncio.run(main())
+    assert [job.name for job in spooler.jobs] == ["job-0", "job-1", "job-2"]
+    assert [job.size for job in spooler.jobs] == [7, 7, 7]
+    assert spooler.connections == 1
+
+
+def test_socket_printer_without_reuse_sends_bare_jobs():
+    async def main():
+        spooler = await FakeSpooler().start()
+        printer = SocketPrinter("127.0.0.1", spooler.port, timeout=2, reuse=False)
+        await printer.send(b"one", "a")
+        await printer.send(b"two", "b")
+        await asyncio.sleep(0.05)
+        await spooler.close()
+        return spooler
+
+    spooler = asyncio.run(main())
+    assert [job.size for job in spooler.jobs] == [3, 3]
+    assert spooler.connections == 2
+
+
+def test_socket_printer_reconnects_after_the_printer_restarts():
+    async def main():
+        spooler = await FakeSpooler().start()
+        printer = SocketPrinter("127.0.0.1", spooler.port, timeout=2)
+        await printer.send(b"before", "a")
+        await spooler.close()
+        spooler = await FakeSpooler(port=spooler.port).start()
+        await printer.send(b"after", "b")
+        await printer.close()
+        await asyncio.sleep(0.05)
+        await spooler.close()
+        return spooler
+
+    spooler = asyncio.run(main())
+    assert [job.name for job in spooler.jobs] == ["b"]
+
+
+@pytest.mark.parametrize("reuse", [True, False])
+def test_stalled_socket_printer_raises_instead_of_hanging(reuse):
+    async def main():
+        async with StalledPrinter() as stalled:
+            printer = SocketPrinter("127.0.0.1", stalled.port, timeout=0.2, reuse=reuse)
+            with pytest.raises(PrinterError, match="timeout"):
+                # far more than the socket buffers hold
+                await asyncio.wait_for(printer.send(b"x" * (64 << 20), "j"), 5)
+            await asyncio.wait_for(printer.close(), 1)
+
+    asyncio.run(main())
+
+
+def test_pool_fails_over_to_the_next_printer():
+    async def main():
+        spooler = await FakeSpooler().start()
+        pool = PrinterPool(
+            {
+                "dead": SocketPrinter("127.0.0.1", _closed_port(), timeout=1),
+                "live": SocketPrinter("127.0.0.1", spooler.port, timeout=1),
+            },
+            cooldown=30,
+        )
+        dispatched = []
+
+        async def on_dispatch(name):
+            dispatched.append(name)
+
+        printed_on = await pool.send(
+            b"badge", "job-1", preferred="dead", on_dispatch=on_dispatch
+        )
+        # the dead printer is in cooldown: the next job goes straight to live
+        second = await pool.send(b"badge", "job-2", preferred="dead")
+        stats = pool.stats()
+        await pool.close()
+        await asyncio.sleep(0.05)
+        await spooler.close()
+        return printed_on, second, dispatched, stats, spooler
+
+    printed_on, second, dispatched, stats, spooler = asyncio.run(main())
+    assert (printed_on, second) == ("live", "live")
+    assert dispatched == ["dead", "live"]
+    assert stats["dead"]["online"] is False
+    assert stats["dead"]["failed"] == 1
+    assert stats["dead"]["last_error"]
+    assert stats["live"]["printed"] == 2
+    assert [job.name for job in spooler.jobs] == ["job-1", "job-2"]
+
+
+def test_pool_fails_over_from_a_stalled_printer():
+    async def main():
+        async with StalledPrinter() as stalled:
+            pool = PrinterPool(
+                {
+                    "stalled": SocketPrinter("127.0.0.1", stalled.port, timeout=0.2),
+                    "backup": SimulatedPrinter(delay=0),
+                },
+                cooldown=30,
+            )
+            name = await asyncio.wait_for(
+                pool.send(b"x" * (64 << 20), "j", preferred="stalled"), 5
+            )
+            await asyncio.wait_for(pool.close(), 1)
+            return name, pool.stats()["stalled"]
+
+    name, stalled = asyncio.run(main())
+    assert name == "backup"
+    assert stalled["failed"] == 1
+    assert stalled["pending"] == 0
+
+
+def test_pool_fails_over_from_an_unwritable_file_sink(tmp_path):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+
+    async def main():
+        pool = PrinterPool(
+            {
+                "file": FileSinkPrinter(blocker / "spool"),
+                "backup": FileSinkPrinter(tmp_path / "spool"),
+            },
+            cooldown=30,
+        )
+        name = await pool.send(b"badge", "job-1", preferred="file")
+        return name, pool.stats()["file"]
+
+    name, broken = asyncio.run(main())
+    assert name == "backup"
+    assert broken["online"] is False
+    assert (tmp_path / "spool" / "job-1.png").read_bytes() == b"badge"
+
+
+def test_pool_raises_when_every_printer_fails():
+    async def main():
+        pool = PrinterPool(
+            {
+                "a": SocketPrinter("127.0.0.1", _closed_port(), timeout=1),
+                "b": SocketPrinter("127.0.0.1", _closed_port(), timeout=1),
+            },
+            cooldown=30,
+        )
+        with pytest.raises(PrinterError) as err:
+            await pool.send(b"badge", "job-1")
+        await pool.close()
+        return str(err.value)
+
+    message = asyncio.run(main())
+    assert "a:" in message and "b:" in message
+
+
+def test_pool_balances_across_online_printers():
+    async def main():
+        pool = PrinterPool(
+            {"a": SimulatedPrinter(delay=0.05), "b": SimulatedPrinter(delay=0.05)},
+            cooldown=30,
+        )
+        names = await asyncio.gather(*(pool.send(b"x", f"j{i}") for i in range(4)))
+        return sorted(names)
+
+    assert asyncio.run(main()) == ["a", "a", "b", "b"]
@@ -0,0 +1,179 @@
+import asyncio
+
+import pytest
+
+from app.scheduler import JobScheduler
+
+
+async def _run_order(scheduler: JobScheduler, jobs):
+    """Queues jobs (job_id, priority, owner) behind a held slot; returns run order."""
+    order = []
+    hold = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot("holder", "vip", "front-desk"):
+            await hold.wait()
+
+    async def job(job_id, priority, owner):
+        async with scheduler.slot(job_id, priority, owner):
+            order.append(job_id)
+
+    holding = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    tasks = []
+    for spec in jobs:
+        tasks.append(asyncio.create_task(job(*spec)))
+        await asyncio.sleep(0)  # enqueue in this order
+    hold.set()
+    await asyncio.gather(holding, *tasks)
+    return order
+
+
+def test_higher_priority_runs_first():
+    async def main():
+        scheduler = JobScheduler(max_in_flight=1)
+        return await _run_order(
+            scheduler,
+            [
+                ("b1", "batch", "import"),
+                ("w1", "walkup", "k1"),
+                ("r1", "reprint", "k2"),
+                ("v1", "vip", "k3"),
+            ],
+        )
+
+    assert asyncio.run(main()) == ["v1", "r1", "w1", "b1"]
+
+
+def test_round_robin_across_owners_within_a_priority():
+    async def main():
+        scheduler = JobScheduler(max_in_flight=1)
+        return await _run_order(
+            scheduler,
+            [
+                ("a1", "walkup", "kiosk-a"),
+                ("a2", "walkup", "kiosk-a"),
+                ("a3", "walkup", "kiosk-a"),
+                ("b1", "walkup", "kiosk-b"),
+                ("c1", "walkup", "kiosk-c"),
+                ("b2", "walkup", "kiosk-b"),
+            ],
+        )
+
+    assert asyncio.run(main()) == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+
+def test_waiting_lists_dispatch_order():
+    async def main():
+        scheduler = JobScheduler(max_in_flight=1)
+        hold = asyncio.Event()
+
+        async def job(job_id, priority, owner):
+            async with scheduler.slot(job_id, priority, owner):
+                await hold.wait()
+
+        tasks = []
+        for spec in [
+            ("x", "walkup", "a"),
+            ("a1", "walkup", "a"),
+            ("a2", "walkup", "a"),
+            ("b1", "walkup", "b"),
+            ("v1", "vip", "c"),
+        ]:
+            tasks.append(asyncio.create_task(job(*spec)))
+            await asyncio.sleep(0)
+        waiting = [t.job_id for t in scheduler.waiting()]
+        hold.set()
+        await asyncio.gather(*tasks)
+        return waiting
+
+    assert asyncio.run(main()) == ["v1", "a1", "b1", "a2"]
+
+
+def test_max_in_flight_is_respected():
+    async def main():
+        scheduler = JobScheduler(max_in_flight=2)
+        running = peak = 0
+
+        async def job(i):
+            nonlocal running, peak
+            async with scheduler.slot(str(i), "walkup", f"k{i % 3}"):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(job(i) for i in range(10)))
+        return peak, scheduler.in_flight, scheduler.queued
+
+    assert asyncio.run(main()) == (2, 0, 0)
+
+
+def test_cancelled_while_queued_is_withdrawn():
+    async def main():
+        scheduler = JobScheduler(max_in_flight=1)
+        hold = asyncio.Event()
+        ran = []
+
+        async def job(job_id):
+            async with scheduler.slot(job_id, "walkup", job_id):
+                ran.append(job_id)
+                await hold.wait()
+
+        first = asyncio.create_task(job("first"))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(job("queued"))
+        await asyncio.sleep(0)
+        assert scheduler.queued == 1
+
+        queued.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.queued == 0
+        hold.set()
+        await first
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        async with scheduler.slot("next", "walkup", "k"):
+            ran.append("next")
+        return ran, scheduler.in_flight
+
+    assert asyncio.run(main()) == (["first", "next"], 0)
+
+
+def test_cancelled_in_the_same_turn_as_a_release():
+    # The running job frees its slot while the waiting one is being cancelled:
+    # the cancelled ticket must not be granted (nor keep the slot).
+    async def main():
+        scheduler = JobScheduler(max_in_flight=1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("holder", "walkup", "a"):
+                await release.wait()
+
+        async def waiter():
+            async with scheduler.slot("waiter", "walkup", "b"):
+                pass
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        release.set()
+        waiting.cancel()
+        await holding  # must not raise InvalidStateError
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.in_flight == 0
+        await asyncio.wait_for(_run_order(scheduler, [("next", "walkup", "c")]), 1)
+
+    asyncio.run(main())
+
+
+def test_unknown_priority_is_rejected():
+    async def main():
+        async with JobScheduler(1).slot("j", "urgent", "k"):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(main())